@@ -0,0 +1,183 @@
+# utils/automod_rules.py
+import random
+import re
+import string
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+# --- Constantes ---
+LINK_PATTERN = r"https?://(?P<link_domain>[^\s/<>]+)|discord(?:\.gg|(?:app)?\.com/invite)/\S+"
+MAX_BANNED_WORDS = 500
+MAX_BANNED_REGEXES = 20
+MAX_REGEX_LENGTH = 200
+GLOBAL_FLAGS_PATTERN = re.compile(r"(?<!\\)\(\?[aiLmsux]+\)")
+
+@dataclass(frozen=True)
+class RuleMatch:
+    kind: str   # "word", "regex" ou "link"
+    rule: str   # Le mot, l'expression ou le domaine qui a déclenché
+    excerpt: str
+
+def trie_regex(words: Iterable[str]) -> str:
+    """
+    Expression équivalente à `mot1|mot2|...` mais factorisée en arbre de préfixes :
+    le moteur ne suit qu'une branche par caractère au lieu d'essayer chaque mot à chaque position.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node: dict) -> str:
+        is_end = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != ""]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        return body + "?" if is_end else body
+
+    return build(trie)
+
+class RuleSet:
+    """
+    Règles d'un serveur (mots interdits, regex, liens) compilées en UNE seule expression.
+    Tous les mots interdits forment une seule alternative factorisée (trie_regex), chaque regex
+    et la détection de liens une alternative nommée : un message est vérifié en un seul passage.
+    `match.lastgroup` indique l'alternative, le texte trouvé indique le mot.
+    """
+    def __init__(self, banned_words: Iterable[str] = (), banned_regexes: Iterable[str] = (),
+                 block_links: bool = False, allowed_domains: Iterable[str] = ()):
+        self._rules: Dict[str, Tuple[str, str]] = {}  # nom du groupe -> (type, règle)
+        self.banned_words = set(w.strip().lower() for w in banned_words if w.strip())
+        alternatives = []
+        if self.banned_words:
+            alternatives.append(rf"(?<!\w)(?P<words>{trie_regex(self.banned_words)})(?!\w)")
+        for i, pattern in enumerate(banned_regexes):
+            self._rules[f"r{i}"] = ("regex", pattern)
+            alternatives.append(f"(?P<r{i}>{pattern})")
+        if block_links:
+            alternatives.append(f"(?P<link>{LINK_PATTERN})")
+        self.allowed_domains = {d.lower().lstrip(".") for d in allowed_domains}
+        self.block_links = block_links
+        self.pattern: Optional[re.Pattern] = re.compile("|".join(alternatives), re.IGNORECASE) if alternatives else None
+
+    @classmethod
+    def from_config(cls, config: Mapping) -> "RuleSet":
+        return cls(config.get("banned_words", ()), config.get("banned_regexes", ()),
+                   config.get("block_links", False), config.get("allowed_domains", ()))
+
+    def __len__(self) -> int:
+        return len(self.banned_words) + len(self._rules) + (1 if self.block_links else 0)
+
+    def _domain_allowed(self, domain: Optional[str]) -> bool:
+        if not domain:
+            return False  # Invitation Discord
+        domain = domain.lower().split(":")[0]
+        return any(domain == allowed or domain.endswith("." + allowed) for allowed in self.allowed_domains)
+
+    def check(self, content: str) -> Optional[RuleMatch]:
+        """Première règle enfreinte par le message, ou None."""
+        if self.pattern is None or not content:
+            return None
+        for match in self.pattern.finditer(content):
+            group = match.lastgroup
+            if group == "link":
+                domain = match.group("link_domain")
+                if self._domain_allowed(domain):
+                    continue
+                return RuleMatch("link", domain or "invitation Discord", match.group(0)[:100])
+            if group == "words":
+                return RuleMatch("word", match.group(0).lower(), match.group(0)[:100])
+            kind, rule = self._rules[group]
+            return RuleMatch(kind, rule, match.group(0)[:100])
+        return None
+
+
+def validate_regex(pattern: str) -> Optional[str]:
+    """Retourne un message d'erreur si l'expression est refusée, None sinon."""
+    if len(pattern) > MAX_REGEX_LENGTH:
+        return f"L'expression dépasse {MAX_REGEX_LENGTH} caractères."
+    try:
+        compiled = re.compile(pattern)
+    except re.error as e:
+        return f"Expression invalide : {e}"
+    # Groupes nommés et références arrière casseraient la numérotation de l'expression combinée
+    if compiled.groupindex or re.search(r"\\[1-9]", pattern):
+        return "Les groupes nommés et les références arrière (\\1...) ne sont pas autorisés."
+    # Un drapeau global (?i) n'est accepté qu'en tête de l'expression combinée : seule la forme locale (?i:...) passe
+    if GLOBAL_FLAGS_PATTERN.search(pattern):
+        return "Les drapeaux globaux comme (?i) ne sont pas autorisés : utilisez la forme locale (?i:...)."
+    return None
+
+
+class RuleEngine:
+    """
+    Cache des RuleSet compilés par serveur ; invalidé uniquement quand la config automod change.
+    Une config qui ne compile pas (regex enregistrée avant validation...) ne casse pas l'automod :
+    les dernières règles valides du serveur restent en place, et l'échec est lui aussi mis en cache.
+    """
+    def __init__(self):
+        self._compiled: Dict[int, RuleSet] = {}
+        self._last_good: Dict[int, RuleSet] = {}
+        self.compilations = 0
+        self.compile_errors = 0
+
+    def get(self, guild_id: int, config: Mapping) -> RuleSet:
+        rule_set = self._compiled.get(guild_id)
+        if rule_set is None:
+            try:
+                rule_set = RuleSet.from_config(config)
+                self.compilations += 1
+            except re.error as e:
+                self.compile_errors += 1
+                rule_set = self._last_good.get(guild_id) or RuleSet()
+                print(f"ERREUR règles automod invalides pour le serveur {guild_id} ({e}) : dernières règles valides conservées.")
+            self._compiled[guild_id] = self._last_good[guild_id] = rule_set
+        return rule_set
+
+    def invalidate(self, guild_id: Optional[int] = None):
+        if guild_id is None:
+            self._compiled.clear()
+        else:
+            self._compiled.pop(guild_id, None)
+
+
+# --- Benchmark sur un corpus synthétique ---
+def _random_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10)))
+
+def benchmark_rule_engine(rule_counts: Iterable[int] = (10, 100, 500), messages: int = 20000, seed: int = 42) -> List[dict]:
+    """Compare l'expression combinée à une boucle règle par règle, pour différents nombres de mots interdits."""
+    rng = random.Random(seed)
+    corpus = [" ".join(_random_word(rng) for _ in range(rng.randint(3, 30))) for _ in range(messages)]
+    corpus += [f"va voir https://{_random_word(rng)}.com/page" for _ in range(messages // 100)]
+    results = []
+    for count in rule_counts:
+        words = [_random_word(rng) + _random_word(rng) for _ in range(count)]
+        for i in range(0, len(corpus), 50):
+            corpus[i] += " " + rng.choice(words)
+        rule_set = RuleSet(words, [r"fr[e3]{2}\s*nitro"], block_links=True, allowed_domains=["youtube.com"])
+        naive = [re.compile(rf"(?<!\w){re.escape(w)}(?!\w)", re.IGNORECASE) for w in words]
+
+        start = time.perf_counter()
+        combined_hits = sum(1 for message in corpus if rule_set.check(message))
+        combined = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for message in corpus:
+            any(p.search(message) for p in naive)
+        loop = time.perf_counter() - start
+
+        results.append({"rules": count, "hits": combined_hits,
+                        "combined_us": combined * 1e6 / len(corpus), "loop_us": loop * 1e6 / len(corpus)})
+        print(f"{count:>4} règles : combinée {combined * 1e6 / len(corpus):7.1f} µs/message, "
+              f"règle par règle {loop * 1e6 / len(corpus):7.1f} µs/message ({combined_hits} messages bloqués)")
+    return results
+
+if __name__ == "__main__":
+    benchmark_rule_engine()
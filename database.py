@@ -3,26 +3,110 @@ import aiosqlite
 import os
 import traceback
 import json
-from typing import Optional, Dict, List, Any
+import asyncio
+import contextvars
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, List, Any, Iterable
 from datetime import datetime, timezone
 
+from utils.level_curve import apply_xp
+
 DATA_DIR = "./data"
 DB_PATH = os.path.join(DATA_DIR, "database.db")
 
+# Default connection profile (override with DatabaseManager(profile=...))
+DEFAULT_CONNECTION_PROFILE = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 64 * 1024 * 1024,
+    "cache_size": -16000,
+    "busy_timeout": 5000,
+}
+DEFAULT_READ_POOL_SIZE = 3
+
+# True for the task currently inside an `async with db.transaction()` block
+_in_transaction: contextvars.ContextVar[bool] = contextvars.ContextVar("_in_transaction", default=False)
+
+# Hot read statements registered at startup (see fetch_one_named / fetch_all_named)
+HOT_STATEMENTS = {
+    "user_data": "SELECT * FROM user_data WHERE guild_id=? AND user_id=?",
+}
+# "dict": plain dict; "tuple": raw tuple, no conversion; "namedtuple": attribute access without a dict
+ROW_MODES = ("dict", "tuple", "namedtuple")
+
+
+# Ordered (version, description, statements); append new versions, never edit published ones.
+# The bot's manager (panel/dashboard/database.py) migrates the same file with its own list and
+# `schema_version` table, so these versions live in a separate table instead of sharing numbers.
+SCHEMA_VERSION_TABLE = "core_schema_version"
+MIGRATIONS = [
+    (1, "Leaderboard index on user_data", (
+        "CREATE INDEX IF NOT EXISTS idx_user_data_leaderboard ON user_data (guild_id, level DESC, xp DESC, user_id)",
+    )),
+]
+
 
 class DatabaseManager:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, profile: Optional[Dict[str, Any]] = None, read_pool_size: int = DEFAULT_READ_POOL_SIZE):
         self.db_path = db_path
+        self.profile = {**DEFAULT_CONNECTION_PROFILE, **(profile or {})}
+        self.read_pool_size = read_pool_size
         self._connection: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+        self._read_connections: List[aiosqlite.Connection] = []
+        self._read_pool: Optional[asyncio.Queue] = None
+        # Named statements, reusable cursors per (connection, name) and row types
+        self._statements: Dict[str, str] = dict(HOT_STATEMENTS)
+        self._cursor_cache: Dict[tuple, aiosqlite.Cursor] = {}
+        self._row_types: Dict[str, type] = {}
 
     async def connect(self):
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self._connection = await aiosqlite.connect(self.db_path)
-        self._connection.row_factory = aiosqlite.Row
-        await self._connection.execute("PRAGMA foreign_keys = ON;")
+        self._connection = await self._open_connection()
+        async with self._connection.execute(f"PRAGMA journal_mode = {self.profile['journal_mode']};") as cursor:
+            await cursor.fetchone()
+        if self.read_pool_size > 0 and self.db_path != ":memory:":
+            self._read_pool = asyncio.Queue()
+            for _ in range(self.read_pool_size):
+                conn = await self._open_connection()
+                await conn.execute("PRAGMA query_only = ON;")
+                self._read_connections.append(conn)
+                self._read_pool.put_nowait(conn)
         print("✅ DB Connected")
 
+    async def _open_connection(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path)
+        conn.row_factory = aiosqlite.Row
+        await conn.executescript(f"""
+            PRAGMA foreign_keys = ON;
+            PRAGMA synchronous = {self.profile['synchronous']};
+            PRAGMA mmap_size = {int(self.profile['mmap_size'])};
+            PRAGMA cache_size = {int(self.profile['cache_size'])};
+            PRAGMA busy_timeout = {int(self.profile['busy_timeout'])};
+        """)
+        return conn
+
+    @asynccontextmanager
+    async def _reader(self):
+        """Borrow a read-only connection; inside a transaction, read on the writer."""
+        if self._read_pool is None or _in_transaction.get():
+            yield self._connection
+            return
+        conn = await self._read_pool.get()
+        try:
+            yield conn
+        finally:
+            self._read_pool.put_nowait(conn)
+
     async def close(self):
+        for cursor in self._cursor_cache.values():
+            await cursor.close()
+        self._cursor_cache.clear()
+        for conn in self._read_connections:
+            await conn.close()
+        self._read_connections.clear()
+        self._read_pool = None
         if self._connection:
             await self._connection.close()
 
@@ -52,38 +136,191 @@ class DatabaseManager:
         COMMIT;
         """
         await self._connection.executescript(schema)
+        await self.run_migrations()
         print("✅ Tables Ready")
 
+    async def run_migrations(self):
+        await self.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT NOT NULL
+            )
+        """)
+        row = await self.fetch_one(f"SELECT MAX(version) AS version FROM {SCHEMA_VERSION_TABLE}")
+        current_version = (row["version"] or 0) if row else 0
+        for version, description, statements in MIGRATIONS:
+            if version <= current_version:
+                continue
+            async with self.transaction():
+                for statement in statements:
+                    await self.execute(statement)
+                await self.execute(
+                    f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, description, applied_at) VALUES (?, ?, ?)",
+                    (version, description, datetime.now(timezone.utc).isoformat())
+                )
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Group every write of the block into a single commit (rolled back on error)."""
+        if _in_transaction.get():
+            yield self
+            return
+        async with self._write_lock:
+            token = _in_transaction.set(True)
+            try:
+                yield self
+                await self._connection.commit()
+            except BaseException:
+                await self._connection.rollback()
+                raise
+            finally:
+                _in_transaction.reset(token)
+
     async def execute(self, query: str, params: tuple = ()):
-        async with self._connection.cursor() as cursor:
-            await cursor.execute(query, params)
+        if _in_transaction.get():
+            await self._connection.execute(query, params)
+            return
+        async with self._write_lock:
+            async with self._connection.cursor() as cursor:
+                await cursor.execute(query, params)
+                await self._connection.commit()
+
+    async def execute_many(self, query: str, params_seq: Iterable[tuple]):
+        params_seq = list(params_seq)
+        if not params_seq:
+            return
+        if _in_transaction.get():
+            await self._connection.executemany(query, params_seq)
+            return
+        async with self._write_lock:
+            await self._connection.executemany(query, params_seq)
             await self._connection.commit()
 
-    async def fetch_one(self, query: str, params: tuple = ()):
-        async with self._connection.cursor() as cursor:
-            await cursor.execute(query, params)
-            row = await cursor.fetchone()
+    async def execute_fetch_one(self, query: str, params: tuple = ()):
+        """Run a write with RETURNING on the writer connection and return its first row."""
+        if _in_transaction.get():
+            async with self._connection.execute(query, params) as cursor:
+                row = await cursor.fetchone()
+            return dict(row) if row else None
+        async with self._write_lock:
+            async with self._connection.execute(query, params) as cursor:
+                row = await cursor.fetchone()
+            await self._connection.commit()
             return dict(row) if row else None
 
+    async def fetch_one(self, query: str, params: tuple = ()):
+        async with self._reader() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(query, params)
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
     async def fetch_all(self, query: str, params: tuple = ()):
-        async with self._connection.cursor() as cursor:
-            await cursor.execute(query, params)
+        async with self._reader() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute(query, params)
+                rows = await cursor.fetchall()
+                return [dict(r) for r in rows]
+
+    # --- Named statements (fast path) ---
+    def register_statement(self, name: str, query: str):
+        """Register a frequent read statement under a name."""
+        self._statements[name] = query
+        self._row_types.pop(name, None)
+
+    def _convert_row(self, name: str, cursor: aiosqlite.Cursor, row, row_mode: str):
+        if row is None or row_mode == "tuple":
+            return row
+        if row_mode == "namedtuple":
+            row_type = self._row_types.get(name)
+            if row_type is None:
+                fields = [col[0] for col in cursor.description]
+                row_type = self._row_types[name] = namedtuple(f"{name.title().replace('_', '')}Row", fields, rename=True)
+            return row_type._make(row)
+        return dict(zip([col[0] for col in cursor.description], row))
+
+    @asynccontextmanager
+    async def _named_cursor(self, name: str):
+        """
+        Cursor without row_factory for a named statement. On a pooled reader (borrowed exclusively)
+        the cursor is kept and reused; otherwise a throwaway cursor is used. Callers must read the
+        result to the end (fetchall): that resets the statement, otherwise the reader would stay in
+        a read transaction (stale snapshot, WAL checkpoints blocked). After an error the kept cursor
+        is closed and recreated on next use.
+        """
+        if name not in self._statements:
+            raise KeyError(f"Unknown named statement: {name}")
+        async with self._reader() as conn:
+            if conn is self._connection:
+                async with conn.cursor() as cursor:
+                    cursor.row_factory = None
+                    yield cursor
+                return
+            key = (id(conn), name)
+            cursor = self._cursor_cache.get(key)
+            if cursor is None:
+                cursor = self._cursor_cache[key] = await conn.cursor()
+                cursor.row_factory = None
+            try:
+                yield cursor
+            except BaseException:
+                self._cursor_cache.pop(key, None)
+                await cursor.close()
+                raise
+
+    async def fetch_one_named(self, name: str, params: tuple = (), row_mode: str = "dict"):
+        """For key lookups (at most one row): the whole result is read, which resets the statement."""
+        async with self._named_cursor(name) as cursor:
+            await cursor.execute(self._statements[name], params)
+            rows = await cursor.fetchall()
+            return self._convert_row(name, cursor, rows[0] if rows else None, row_mode)
+
+    async def fetch_all_named(self, name: str, params: tuple = (), row_mode: str = "dict") -> list:
+        async with self._named_cursor(name) as cursor:
+            await cursor.execute(self._statements[name], params)
             rows = await cursor.fetchall()
-            return [dict(r) for r in rows]
+            return [self._convert_row(name, cursor, row, row_mode) for row in rows]
 
     async def get_user_data(self, guild_id, user_id):
-        data = await self.fetch_one(
-            "SELECT * FROM user_data WHERE guild_id=? AND user_id=?",
-            (guild_id, user_id)
-        )
+        data = await self.fetch_one_named("user_data", (guild_id, user_id))
         if not data:
-            await self.execute(
-                "INSERT INTO user_data (guild_id,user_id) VALUES (?,?)",
+            return await self.execute_fetch_one(
+                "INSERT INTO user_data (guild_id,user_id) VALUES (?,?) "
+                "ON CONFLICT(guild_id,user_id) DO UPDATE SET user_id=excluded.user_id RETURNING *",
                 (guild_id, user_id)
             )
-            return await self.get_user_data(guild_id, user_id)
         return data
 
+    async def add_xp(self, guild_id, user_id, delta):
+        """
+        Atomically add (or remove) XP, creating the row if needed. The upsert returns the row in one
+        round trip; the level is then recomputed with level_curve.apply_xp (carry-over, multi-level
+        jumps, floor at 0) and written back in the same transaction only if it changed.
+        Returns the new xp/level/money plus levels_gained.
+        """
+        async with self.transaction():
+            row = await self.execute_fetch_one(
+                "INSERT INTO user_data (guild_id,user_id,xp) VALUES (?,?,?) "
+                "ON CONFLICT(guild_id,user_id) DO UPDATE SET xp=xp+excluded.xp RETURNING xp,level,money",
+                (guild_id, user_id, delta)
+            )
+            level, xp, levels_gained = apply_xp(row["level"], row["xp"], 0)
+            if (level, xp) != (row["level"], row["xp"]):
+                await self.execute(
+                    "UPDATE user_data SET xp=?,level=? WHERE guild_id=? AND user_id=?",
+                    (xp, level, guild_id, user_id)
+                )
+        return {"xp": xp, "level": level, "money": row["money"], "levels_gained": levels_gained}
+
+    async def add_money(self, guild_id, user_id, delta):
+        """Atomically add money (never below 0), creating the row if needed; returns the new xp/level/money."""
+        return await self.execute_fetch_one(
+            "INSERT INTO user_data (guild_id,user_id,money) VALUES (?,?,MAX(?,0)) "
+            "ON CONFLICT(guild_id,user_id) DO UPDATE SET money=MAX(money+?,0) RETURNING xp,level,money",
+            (guild_id, user_id, delta, delta)
+        )
+
     async def get_leaderboard(self, guild_id, limit=10):
         return await self.fetch_all(
             "SELECT user_id,xp,level FROM user_data WHERE guild_id=? ORDER BY level DESC,xp DESC LIMIT ?",
@@ -36,15 +36,7 @@ CREATE TABLE IF NOT EXISTS marriages (
 )
 """)
 
-# PRISON
-c.execute("""
-CREATE TABLE IF NOT EXISTS prison (
-    guild_id INTEGER,
-    user_id INTEGER,
-    release_time INTEGER,
-    PRIMARY KEY (guild_id, user_id)
-)
-""")
+# PRISON : la table (et sa date de libération, release_at) est gérée par le bot, voir DatabaseManager
 
 conn.commit()
 conn.close()
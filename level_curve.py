@@ -0,0 +1,54 @@
+# utils/level_curve.py
+from bisect import bisect_right
+from typing import List, Tuple
+
+# --- Courbe de niveaux ---
+# Il faut 5*L² + 50*L + 100 XP pour passer du niveau L au niveau L+1.
+# user_data.xp contient la progression dans le niveau courant, pas l'XP totale.
+MIN_LEVEL = 1
+MAX_LEVEL = 1000
+
+def xp_needed_for_level(level: int) -> int:
+    """XP nécessaire pour passer du niveau `level` au suivant."""
+    return 5 * (level ** 2) + 50 * level + 100
+
+def _build_thresholds(max_level: int) -> List[int]:
+    # _THRESHOLDS[i] = XP totale cumulée pour atteindre le niveau MIN_LEVEL + i
+    thresholds = [0]
+    for level in range(MIN_LEVEL, max_level):
+        thresholds.append(thresholds[-1] + xp_needed_for_level(level))
+    return thresholds
+
+_THRESHOLDS: List[int] = _build_thresholds(MAX_LEVEL)
+
+def total_xp_for_level(level: int) -> int:
+    """XP totale cumulée nécessaire pour atteindre `level` depuis le niveau 1 (O(1))."""
+    level = max(MIN_LEVEL, min(level, MAX_LEVEL))
+    return _THRESHOLDS[level - MIN_LEVEL]
+
+def to_total_xp(level: int, xp: int) -> int:
+    """Convertit un couple (niveau, progression) en XP totale."""
+    return total_xp_for_level(level) + xp
+
+def level_for_total_xp(total_xp: int) -> int:
+    """Niveau correspondant à une XP totale, par bissection (O(log n))."""
+    if total_xp <= 0:
+        return MIN_LEVEL
+    return MIN_LEVEL + bisect_right(_THRESHOLDS, total_xp) - 1
+
+def xp_to_next_level(total_xp: int) -> int:
+    """XP restant à gagner avant le prochain niveau."""
+    level = level_for_total_xp(total_xp)
+    if level >= MAX_LEVEL:
+        return 0
+    return total_xp_for_level(level + 1) - total_xp
+
+def apply_xp(level: int, xp: int, gain: int) -> Tuple[int, int, int]:
+    """
+    Ajoute `gain` XP à un utilisateur au niveau `level` avec `xp` de progression.
+    Gère les sauts de plusieurs niveaux (grosses attributions admin).
+    Retourne (nouveau_niveau, nouvelle_progression, niveaux_gagnés).
+    """
+    total_xp = max(to_total_xp(level, xp) + gain, 0)
+    new_level = level_for_total_xp(total_xp)
+    return new_level, total_xp - total_xp_for_level(new_level), new_level - level
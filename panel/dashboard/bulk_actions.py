@@ -0,0 +1,133 @@
+# utils/bulk_actions.py
+import asyncio
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+# --- Constantes ---
+DEFAULT_BULK_CONCURRENCY = 8
+# Budget par route et par serveur : (requêtes par seconde, rafale). Volontairement sous les
+# limites Discord pour que discord.py n'ait presque jamais à attendre un 429.
+ROUTE_BUDGETS: Dict[str, Tuple[float, int]] = {
+    "unban": (5.0, 5),
+    "channel_permissions": (25.0, 25),  # Route propre à chaque salon, on reste sous la limite globale (50/s)
+    "member_roles": (5.0, 5),
+}
+DEFAULT_ROUTE_BUDGET = (5.0, 5)
+
+class RateBudget:
+    """Seau à jetons : `rate` requêtes par seconde en régime établi, `burst` d'un coup au plus."""
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()  # Les appelants sont servis dans l'ordre d'arrivée
+        self.waited = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+@dataclass
+class BulkItemResult:
+    item: Any
+    ok: bool
+    error: Optional[str] = None
+    duration: float = 0.0
+
+@dataclass
+class BulkReport:
+    route: str
+    results: List[BulkItemResult]
+    wall_time: float
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for r in self.results if r.ok)
+
+    @property
+    def failed(self) -> List[BulkItemResult]:
+        return [r for r in self.results if not r.ok]
+
+    def summary(self) -> str:
+        return f"{self.route} : {self.succeeded}/{len(self.results)} réussie(s) en {self.wall_time:.1f} s"
+
+class BulkExecutor:
+    """
+    Exécute une mutation Discord sur une liste d'éléments (salons, membres, bans...) en parallèle :
+
+        report = await bulk_executor.run(guild.id, "channel_permissions", guild.channels,
+                                         lambda c: c.set_permissions(role, view_channel=False))
+
+    Le parallélisme est borné par appel (`concurrency`) et le débit par un budget partagé par
+    (route, serveur) : deux traitements simultanés sur un même serveur se partagent le budget.
+    Une erreur sur un élément n'interrompt pas les autres ; chacun a son BulkItemResult.
+    """
+    def __init__(self):
+        self._budgets: Dict[Tuple[str, int], RateBudget] = {}
+
+    def budget(self, route: str, guild_id: int) -> RateBudget:
+        key = (route, guild_id)
+        budget = self._budgets.get(key)
+        if budget is None:
+            budget = self._budgets[key] = RateBudget(*ROUTE_BUDGETS.get(route, DEFAULT_ROUTE_BUDGET))
+        return budget
+
+    async def run(self, guild_id: int, route: str, items: Iterable[Any],
+                  action: Callable[[Any], Awaitable[Any]], concurrency: int = DEFAULT_BULK_CONCURRENCY) -> BulkReport:
+        semaphore = asyncio.Semaphore(concurrency)
+        budget = self.budget(route, guild_id)
+
+        async def run_one(item: Any) -> BulkItemResult:
+            async with semaphore:
+                await budget.acquire()
+                start = time.perf_counter()
+                try:
+                    await action(item)
+                except discord.HTTPException as e:
+                    return BulkItemResult(item, False, f"{e.status} {e.text or e}", time.perf_counter() - start)
+                except Exception as e:
+                    print(f"ERREUR action groupée {route} sur {item!r}: {e}"); traceback.print_exc()
+                    return BulkItemResult(item, False, repr(e), time.perf_counter() - start)
+                return BulkItemResult(item, True, None, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_one(item) for item in items))
+        return BulkReport(route, list(results), time.perf_counter() - start)
+
+
+# --- Benchmark (latence Discord simulée) ---
+def benchmark_bulk_executor(items: int = 300, latency: float = 0.1):
+    """Compare l'exécution séquentielle et groupée d'une action simulée qui prend `latency` secondes."""
+    async def fake_action(item):
+        await asyncio.sleep(latency)
+
+    async def main():
+        start = time.perf_counter()
+        for item in range(items):
+            await fake_action(item)
+        sequential = time.perf_counter() - start
+        report = await BulkExecutor().run(0, "channel_permissions", range(items), fake_action)
+        print(f"{items} actions à {latency * 1000:.0f} ms : séquentiel {sequential:.1f} s, {report.summary()}")
+        return sequential, report
+
+    return asyncio.run(main())
+
+# --- Instance Globale ---
+bulk_executor = BulkExecutor()
+
+if __name__ == "__main__":
+    benchmark_bulk_executor()
@@ -0,0 +1,120 @@
+# utils/jobs.py
+import asyncio
+import time
+import traceback
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import discord
+
+from utils.scheduler import DeadlineScheduler
+
+# --- Constantes ---
+JOB_CONCURRENCY = 10
+JOB_MAX_ATTEMPTS = 8
+JOB_RETRY_BASE_SECONDS = 30
+JOB_RETRY_MAX_SECONDS = 3600
+MISSING_HANDLER_DELAY_SECONDS = 60
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class JobQueue:
+    """
+    File de tâches persistante (table scheduled_jobs) : chaque tâche a un type (`kind`), une charge
+    utile JSON et une échéance. Les cogs enregistrent un handler par type :
+
+        job_queue.register("temp_unban", self.handle_temp_unban)
+        await job_queue.start(self.bot)
+        await job_queue.enqueue("temp_unban", {"guild_id": ..., "user_id": ...}, due_at)
+
+    La ligne n'est supprimée qu'après succès du handler : une tâche interrompue par un arrêt est
+    rejouée au redémarrage (au moins une fois, les handlers doivent donc être idempotents).
+    Un handler qui lève discord.HTTPException est retenté avec un délai exponentiel.
+    Les cogs appellent unregister() puis stop_if_idle() dans cog_unload : la file s'arrête
+    (en attendant les tâches en cours) quand plus aucun handler n'est enregistré, y compris à l'arrêt du bot.
+    """
+    def __init__(self):
+        self.db = None
+        self._handlers: Dict[str, JobHandler] = {}
+        self.scheduler = DeadlineScheduler(self._run_job, max_concurrency=JOB_CONCURRENCY, name="job-queue")
+        self._start_task: Optional[asyncio.Task] = None
+
+    def register(self, kind: str, handler: JobHandler):
+        self._handlers[kind] = handler
+
+    def unregister(self, kind: str):
+        self._handlers.pop(kind, None)
+
+    async def stop_if_idle(self):
+        if not self._handlers:
+            await self.stop()
+
+    async def start(self, bot):
+        """Charge les tâches en attente une fois le bot prêt. Sans effet si déjà démarrée."""
+        if self._start_task is not None:
+            return
+        self.db = bot.db
+        self._start_task = asyncio.create_task(self._load(bot))
+
+    async def _load(self, bot):
+        await bot.wait_until_ready()
+        try:
+            jobs = await self.db.get_pending_jobs()
+        except Exception as e:
+            print(f"ERREUR CRITIQUE au chargement des tâches planifiées : {e}"); traceback.print_exc()
+            self._start_task = None
+            return
+        for job in jobs:
+            self.scheduler.schedule(job["id"], job["due_at"], (job["kind"], job["payload"], job["attempts"], job["due_at"]))
+        self.scheduler.start()
+        print(f"File de tâches démarrée ({len(jobs)} tâche(s) en attente).")
+
+    async def stop(self):
+        if self._start_task:
+            self._start_task.cancel()
+            self._start_task = None
+        await self.scheduler.stop()
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], due_at: float, job_key: Optional[str] = None) -> int:
+        """Enregistre une tâche puis la planifie. Une tâche existante de même `job_key` est remplacée."""
+        job_id = await self.db.add_job(kind, payload, due_at, job_key)
+        self.scheduler.schedule(job_id, due_at, (kind, payload, 0, due_at))
+        return job_id
+
+    async def cancel(self, job_key: str) -> bool:
+        job_id = await self.db.delete_job_by_key(job_key)
+        if job_id is None:
+            return False
+        self.scheduler.cancel(job_id)
+        return True
+
+    async def _run_job(self, job_id: int, entry: tuple):
+        # `due_at` est l'échéance enregistrée en base : elle identifie cette version de la tâche
+        kind, payload, attempts, due_at = entry
+        handler = self._handlers.get(kind)
+        if handler is None:
+            # Le cog propriétaire n'est pas (encore) chargé : on garde la tâche
+            self.scheduler.schedule(job_id, time.time() + MISSING_HANDLER_DELAY_SECONDS, entry)
+            return
+        try:
+            await handler(payload)
+        except discord.HTTPException as e:
+            attempts += 1
+            if attempts >= JOB_MAX_ATTEMPTS:
+                print(f"ERREUR tâche {kind} #{job_id} abandonnée après {attempts} essais : {e}")
+                await self.db.record_job_attempt(job_id, attempts, str(e), None)
+                return
+            retry_at = time.time() + min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOB_RETRY_MAX_SECONDS)
+            await self.db.record_job_attempt(job_id, attempts, str(e), retry_at)
+            self.scheduler.schedule(job_id, retry_at, (kind, payload, attempts, retry_at))
+            return
+        except Exception as e:
+            # Erreur de programmation ou de données : pas de nouvel essai, la ligne reste pour analyse
+            print(f"ERREUR tâche {kind} #{job_id} : {e}"); traceback.print_exc()
+            await self.db.record_job_attempt(job_id, attempts + 1, repr(e), None)
+            return
+        # Si le handler a replanifié la même job_key, l'UPSERT a gardé l'ID mais changé l'échéance : on ne supprime pas
+        await self.db.delete_job(job_id, due_at)
+
+
+# --- Instance Globale ---
+job_queue = JobQueue()
@@ -1,12 +1,22 @@
 import discord
 from discord import app_commands  # <-- CHANGEMENT 1: Utilisation de app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
+from collections import Counter
+import os
+import traceback
 import random
 import asyncio
 import datetime
 import re
 import json
 
+# --- Dépendances ---
+from utils.rankings import rankings
+
+# --- Constantes ---
+ACTIVITY_FLUSH_INTERVAL_SECONDS = 30
+LEGACY_ACTIVITY_FILE = 'data/activity.json'
+
 # --- Les fonctions de gestion de données ne changent pas ---
 def load_data(filename):
     try:
@@ -59,7 +69,72 @@ class Community(commands.GroupCog, name="commu"):
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.db = bot.db
         super().__init__()
+        # Compteurs de messages en attente d'écriture : (guild_id, user_id) -> messages
+        self.pending_activity: Counter = Counter()
+        self._activity_lock = asyncio.Lock()  # Aucune écriture de l'activité pendant le chargement d'un classement
+        rankings.register_board("messages", self.load_activity_ranking)
+
+    async def cog_load(self):
+        try:
+            await self.import_legacy_activity()
+        except Exception as e:  # Le fichier reste en place : nouvel essai au prochain chargement
+            print(f"ERREUR import de activity.json : {e}"); traceback.print_exc()
+        self.flush_activity_loop.start()
+
+    async def cog_unload(self):
+        self.flush_activity_loop.cancel()
+        try:
+            await self.flush_activity()
+        except Exception as e:
+            print(f"ERREUR lors de l'écriture finale de l'activité : {e}"); traceback.print_exc()
+
+    async def import_legacy_activity(self):
+        """
+        Importe une seule fois l'ancien data/activity.json dans la table member_activity. Le marqueur d'import
+        est écrit dans la même transaction que les compteurs : un arrêt avant le renommage ne compte pas deux fois.
+        """
+        if not os.path.exists(LEGACY_ACTIVITY_FILE):
+            return
+        activity = load_data('activity.json')
+        count = await self.db.import_activity(activity)
+        os.replace(LEGACY_ACTIVITY_FILE, LEGACY_ACTIVITY_FILE + '.imported')
+        if count is None:
+            print("-> Cog Communauté : activity.json déjà importé, fichier renommé sans nouvel import.")
+            return
+        rankings.invalidate("messages")
+        print(f"-> Cog Communauté : {count} compteurs d'activité importés depuis activity.json.")
+
+    async def flush_activity(self):
+        async with self._activity_lock:
+            if not self.pending_activity:
+                return
+            pending, self.pending_activity = self.pending_activity, Counter()
+            try:
+                await self.db.add_activity_bulk([(guild_id, user_id, count) for (guild_id, user_id), count in pending.items()])
+            except Exception:
+                self.pending_activity.update(pending)
+                raise
+
+    @tasks.loop(seconds=ACTIVITY_FLUSH_INTERVAL_SECONDS)
+    async def flush_activity_loop(self):
+        try:
+            await self.flush_activity()
+        except Exception as e:
+            print(f"ERREUR dans la boucle flush_activity_loop: {e}"); traceback.print_exc()
+
+    async def load_activity_ranking(self, guild_id: int):
+        """
+        Classement = base + compteurs en attente, figés ensemble sous le verrou (aucune écriture ne peut
+        s'intercaler pendant la lecture). Les messages reçus avant ce point sont déjà comptés : on les retire
+        de la file de rejeu de utils.rankings, qui ne rejouera que les suivants.
+        """
+        async with self._activity_lock:
+            counts = Counter({user_id: count for (gid, user_id), count in self.pending_activity.items() if gid == guild_id})
+            rankings.discard_pending("messages", guild_id)
+            counts.update(dict(await self.db.get_guild_activity(guild_id)))
+        return list(counts.items())
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -74,12 +149,9 @@ class Community(commands.GroupCog, name="commu"):
     @commands.Cog.listener()
     async def on_message(self, message):
         if message.author.bot or not message.guild: return
-        server_id, user_id = str(message.guild.id), str(message.author.id)
-        activity = load_data('activity.json')
-        if server_id not in activity: activity[server_id] = {}
-        if user_id not in activity[server_id]: activity[server_id][user_id] = {'messages': 0}
-        activity[server_id][user_id]['messages'] += 1
-        save_data(activity, 'activity.json')
+        # Compteur en mémoire, écrit en base par flush_activity_loop
+        self.pending_activity[(message.guild.id, message.author.id)] += 1
+        rankings.increment("messages", message.guild.id, message.author.id)
 
     # --- COMMANDES DE BASE ---
     @base.command(name="ping", description="Affiche la latence du bot.")
@@ -192,18 +264,17 @@ class Community(commands.GroupCog, name="commu"):
 
     @avance.command(name="leaderboard", description="Affiche le classement d'activité du serveur (basé sur les messages).")
     async def leaderboard(self, interaction: discord.Interaction):
-        activity = load_data('activity.json').get(str(interaction.guild.id), {})
-        if not activity:
+        ranked = await rankings.get("messages", interaction.guild.id)
+        if not len(ranked):
             return await interaction.response.send_message("Aucune donnée d'activité n'a été collectée.", ephemeral=True)
-        sorted_users = sorted(activity.items(), key=lambda item: item[1]['messages'], reverse=True)
         embed = discord.Embed(title=f"🏆 Classement d'activité de {interaction.guild.name}", color=discord.Color.gold())
         description = ""
         rank_emojis = ["🥇", "🥈", "🥉"]
-        for i, (user_id, data) in enumerate(sorted_users[:10]):
-            member = interaction.guild.get_member(int(user_id))
+        for i, (user_id, messages) in enumerate(ranked.top(10)):
+            member = interaction.guild.get_member(user_id)
             if member:
                 rank = rank_emojis[i] if i < 3 else f"**#{i+1}**"
-                description += f"{rank} {member.mention} - `{data['messages']}` messages\n"
+                description += f"{rank} {member.mention} - `{messages}` messages\n"
         embed.description = description
         await interaction.response.send_message(embed=embed)
 
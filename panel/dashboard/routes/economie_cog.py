@@ -1,7 +1,7 @@
 # cogs/economie_cog.py
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 from typing import Optional, List, Dict
 import json
 import os
@@ -10,78 +10,91 @@ import datetime
 import random
 import time
 
+# --- Dépendances ---
+from utils.database import InsufficientFunds
+from utils.rankings import rankings
+from utils.settings_store import settings_store
+
 # --- Constantes ---
 DATA_DIR = './data'
-# CORRECTION : Utiliser une seule constante pour le fichier de config principal.
-# Le Cog économie lira la section "economy_config" de ce fichier.
-SETTINGS_FILE = os.path.join(DATA_DIR, 'settings.json')
-USER_BALANCES_FILE = os.path.join(DATA_DIR, 'user_balances.json')
+# La section "economy_config" est lue depuis le magasin de paramètres partagé (utils.settings_store).
+# Les soldes sont en base (user_data.money) ; l'ancien fichier n'est lu qu'une fois pour l'import.
+LEGACY_BALANCES_FILE = os.path.join(DATA_DIR, 'user_balances.json')
 DAILY_COOLDOWN_HOURS = 22
+SNAPSHOT_INTERVAL_HOURS = 6
+ECONOMY_CONFIG_DEFAULTS = {
+    "currency_name": "Points",
+    "currency_emoji": "💰",
+    "daily_min": 50,
+    "daily_max": 250
+}
 
 # --- Fonctions Helper JSON ---
 def load_data(filepath):
-    """Charge les données depuis un fichier JSON, le crée s'il manque."""
+    """Charge les données depuis un fichier JSON."""
     try:
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
         with open(filepath, 'r', encoding='utf-8') as f:
             return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
-        with open(filepath, 'w', encoding='utf-8') as f: json.dump({}, f)
         return {}
     except Exception as e:
         print(f"Erreur chargement {filepath}: {e}"); traceback.print_exc(); return {}
 
-def save_data(filepath, data):
-    """Sauvegarde les données dans un fichier JSON de manière atomique."""
-    try:
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        temp_filepath = filepath + ".tmp"
-        with open(temp_filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
-        os.replace(temp_filepath, filepath)
-    except Exception as e:
-        print(f"Erreur critique sauvegarde {filepath}: {e}"); traceback.print_exc()
-
 
 # --- Classe Cog ---
 class EconomieCog(commands.Cog, name="Économie"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        # CORRECTION : Charger les bons fichiers avec les bons noms
-        self.settings = load_data(SETTINGS_FILE)
-        self.user_balances = load_data(USER_BALANCES_FILE)
+        self.db = bot.db
+        rankings.register_board("money", self.load_money_ranking)
+
+    async def cog_load(self):
+        try:
+            await self.import_legacy_balances()
+        except Exception as e:  # Le fichier reste en place : nouvel essai au prochain chargement
+            print(f"ERREUR import de user_balances.json : {e}"); traceback.print_exc()
+        self.snapshot_balances_loop.start()
+
+    async def cog_unload(self):
+        self.snapshot_balances_loop.cancel()
+        await settings_store.flush()
+
+    @tasks.loop(hours=SNAPSHOT_INTERVAL_HOURS)
+    async def snapshot_balances_loop(self):
+        """Fige régulièrement les soldes : un solde se reconstruit depuis l'instantané + la fin du journal."""
+        for guild in self.bot.guilds:
+            try:
+                await self.db.snapshot_balances(guild.id)
+            except Exception as e:
+                print(f"ERREUR instantané des soldes ({guild.id}) : {e}"); traceback.print_exc()
+
+    @snapshot_balances_loop.before_loop
+    async def before_snapshot_balances_loop(self):
+        await self.bot.wait_until_ready()
+
+    async def import_legacy_balances(self):
+        """
+        Importe une seule fois l'ancien data/user_balances.json dans user_data.money. Le marqueur d'import est
+        écrit dans la même transaction que les soldes : un arrêt avant le renommage ne crédite pas deux fois.
+        """
+        if not os.path.exists(LEGACY_BALANCES_FILE):
+            return
+        balances = load_data(LEGACY_BALANCES_FILE)
+        count = await self.db.import_balances(balances)
+        os.replace(LEGACY_BALANCES_FILE, LEGACY_BALANCES_FILE + '.imported')
+        if count is None:
+            print("-> Cog Économie : user_balances.json déjà importé, fichier renommé sans nouvel import.")
+            return
+        rankings.invalidate("money")
+        print(f"-> Cog Économie : {count} comptes importés depuis user_balances.json.")
+
+    async def load_money_ranking(self, guild_id: int):
+        return await self.db.get_guild_money_rows(guild_id)
 
     # CORRECTION : Implémentation des fonctions helper internes
-    def get_guild_config(self, guild_id: int) -> dict:
-        """Récupère ou initialise la config économie depuis le fichier settings global."""
-        guild_id_str = str(guild_id)
-        guild_settings = self.settings.setdefault(guild_id_str, {})
-        eco_config = guild_settings.setdefault("economy_config", {
-            "currency_name": "Points",
-            "currency_emoji": "💰",
-            "daily_min": 50,
-            "daily_max": 250
-        })
-        return eco_config
-    
-    def get_user_data(self, guild_id: int, user_id: int) -> dict:
-        """Récupère ou initialise les données d'un utilisateur."""
-        guild_id_str = str(guild_id)
-        user_id_str = str(user_id)
-        
-        guild_balances = self.user_balances.setdefault(guild_id_str, {})
-        user_data = guild_balances.setdefault(user_id_str, {
-            "balance": 0,
-            "inventory": [],
-            "last_daily": None
-        })
-        
-        # S'assurer que toutes les clés par défaut existent pour l'utilisateur
-        user_data.setdefault("balance", 0)
-        user_data.setdefault("inventory", [])
-        user_data.setdefault("last_daily", None)
-        
-        return user_data
+    def get_guild_config(self, guild_id: int):
+        """Instantané (lecture seule) de la config économie, complété par les valeurs par défaut."""
+        return settings_store.get_section(guild_id, "economy_config", defaults=ECONOMY_CONFIG_DEFAULTS)
 
     # =============================================
     # ==        GROUPE COMMANDES ÉCONOMIE        ==
@@ -95,73 +108,83 @@ class EconomieCog(commands.Cog, name="Économie"):
         if target_user.bot:
             await interaction.response.send_message("❌ Les bots n'ont pas de solde.", ephemeral=True); return
 
-        user_data = self.get_user_data(interaction.guild.id, target_user.id)
+        balance = await self.db.get_balance(interaction.guild.id, target_user.id)
         config = self.get_guild_config(interaction.guild.id)
         embed = discord.Embed(
             title=f"💰 Solde de {target_user.display_name}",
-            description=f"{user_data.get('balance', 0)} {config.get('currency_emoji', '💰')} {config.get('currency_name', 'Points')}",
+            description=f"{balance} {config.get('currency_emoji', '💰')} {config.get('currency_name', 'Points')}",
             color=discord.Color.gold()
         ).set_thumbnail(url=target_user.display_avatar.url)
         await interaction.response.send_message(embed=embed)
 
     @economie_group.command(name="classement", description="Affiche le classement des membres les plus riches.")
-    async def economie_classement(self, interaction: discord.Interaction):
+    @app_commands.describe(page="La page du classement à afficher.")
+    async def economie_classement(self, interaction: discord.Interaction, page: app_commands.Range[int, 1, None] = 1):
         await interaction.response.defer()
         
-        # Recharger les données pour avoir le classement le plus récent
-        self.user_balances = load_data(USER_BALANCES_FILE)
-        
-        guild_balances = self.user_balances.get(str(interaction.guild.id), {})
+        # Le classement est tenu à jour en mémoire (voir utils.rankings), pas de relecture du fichier
+        ranked = await rankings.get("money", interaction.guild.id)
         config = self.get_guild_config(interaction.guild.id)
-        if not guild_balances:
+        if not len(ranked):
             await interaction.followup.send("ℹ️ Personne n'a encore de monnaie.", ephemeral=True); return
 
-        sorted_users = sorted(guild_balances.items(), key=lambda item: item[1].get("balance", 0), reverse=True)
-        
+        page = min(page, ranked.page_count())
         embed = discord.Embed(
             title=f"🏆 Classement - {config.get('currency_name', 'Points')}",
             color=discord.Color.gold()
         )
         description = ""
-        for i, (user_id_str, data) in enumerate(sorted_users[:10]):
-            balance = data.get('balance', 0)
-            description += f"**{i+1}.** <@{user_id_str}> - {balance} {config.get('currency_emoji', '💰')}\n"
+        for i, (user_id, balance) in enumerate(ranked.page(page), start=(page - 1) * 10 + 1):
+            description += f"**{i}.** <@{user_id}> - {balance} {config.get('currency_emoji', '💰')}\n"
         
         embed.description = description if description else "Aucune donnée."
+        embed.set_footer(text=f"Page {page}/{ranked.page_count()}")
         await interaction.followup.send(embed=embed)
 
 
+    @economie_group.command(name="donner", description="Donne une partie de votre solde à un autre membre.")
+    @app_commands.describe(membre="Le membre qui reçoit la monnaie.", montant="Le montant à donner.")
+    async def economie_donner(self, interaction: discord.Interaction, membre: discord.Member, montant: app_commands.Range[int, 1, None]):
+        if membre.bot or membre.id == interaction.user.id:
+            await interaction.response.send_message("❌ Destinataire invalide.", ephemeral=True); return
+
+        config = self.get_guild_config(interaction.guild.id)
+        try:
+            from_balance, to_balance = await self.db.transfer(interaction.guild.id, interaction.user.id, membre.id, montant)
+        except InsufficientFunds as e:
+            await interaction.response.send_message(
+                f"❌ Solde insuffisant ({e.balance} {config.get('currency_emoji', '💰')}).", ephemeral=True
+            ); return
+        rankings.update("money", interaction.guild.id, interaction.user.id, from_balance)
+        rankings.update("money", interaction.guild.id, membre.id, to_balance)
+        await interaction.response.send_message(
+            f"✅ Vous avez donné **{montant}** {config.get('currency_emoji', '💰')} à {membre.mention}."
+        )
+
     @app_commands.command(name="daily", description="Récupère votre récompense quotidienne.")
     async def daily_claim(self, interaction: discord.Interaction):
         config = self.get_guild_config(interaction.guild.id)
-        user_data = self.get_user_data(interaction.guild.id, interaction.user.id)
-        
-        last_daily_str = user_data.get("last_daily")
-        now_utc = datetime.datetime.now(datetime.timezone.utc)
-        
-        if last_daily_str:
-            try:
-                last_daily_dt = datetime.datetime.fromisoformat(last_daily_str)
-                time_since = now_utc - last_daily_dt
-                if time_since.total_seconds() < DAILY_COOLDOWN_HOURS * 3600:
-                    remaining = datetime.timedelta(seconds=(DAILY_COOLDOWN_HOURS * 3600) - time_since.total_seconds())
-                    next_claim = discord.utils.format_dt(now_utc + remaining, style='R')
-                    await interaction.response.send_message(f"⏳ Prochain daily disponible {next_claim}.", ephemeral=True); return
-            except ValueError:
-                print(f"WARN: Format de date invalide pour last_daily de {interaction.user.id}")
         
         min_amount = config.get("daily_min", 50)
         max_amount = config.get("daily_max", 250)
         if max_amount <= min_amount: max_amount = min_amount + 1 
         amount_won = random.randint(min_amount, max_amount)
         
-        user_data["balance"] = user_data.get("balance", 0) + amount_won
-        user_data["last_daily"] = now_utc.isoformat()
-        save_data(USER_BALANCES_FILE, self.user_balances)
+        # Vérification du délai et crédit dans la même requête (voir db.claim_daily)
+        new_balance = await self.db.claim_daily(interaction.guild.id, interaction.user.id, amount_won, DAILY_COOLDOWN_HOURS * 3600)
+        if new_balance is None:
+            last_daily_at = await self.db.get_last_daily(interaction.guild.id, interaction.user.id) or time.time()
+            next_claim_dt = datetime.datetime.fromtimestamp(last_daily_at + DAILY_COOLDOWN_HOURS * 3600, tz=datetime.timezone.utc)
+            next_claim = discord.utils.format_dt(next_claim_dt, style='R')
+            await interaction.response.send_message(f"⏳ Prochain daily disponible {next_claim}.", ephemeral=True); return
+        rankings.update("money", interaction.guild.id, interaction.user.id, new_balance)
         
         await interaction.response.send_message(f"🎉 Vous avez gagné **{amount_won}** {config.get('currency_emoji', '💰')} !")
 
 # --- Setup du Cog ---
 async def setup(bot: commands.Bot):
+    if not hasattr(bot, 'db'):
+        print("ERREUR CRITIQUE (economie_cog.py): L'objet bot n'a pas d'attribut 'db'.")
+        return
     await bot.add_cog(EconomieCog(bot))
     print("Cog Économie (corrigé) chargé.")
\ No newline at end of file
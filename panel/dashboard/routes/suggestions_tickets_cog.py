@@ -7,30 +7,10 @@ import os
 import traceback
 import datetime
 from typing import Optional
-import io
-
-# --- Fonctions Helper (inchangées) ---
-DATA_DIR = './data'
-SETTINGS_FILE = os.path.join(DATA_DIR, 'settings.json')
-
-def load_data(filepath):
-    try:
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'r', encoding='utf-8') as f: return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        with open(filepath, 'w', encoding='utf-8') as f: json.dump({}, f)
-        return {}
-    except Exception as e:
-        print(f"Erreur chargement {filepath}: {e}"); traceback.print_exc(); return {}
-
-def save_data(filepath, data):
-    try:
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        temp_filepath = filepath + ".tmp"
-        with open(temp_filepath, 'w', encoding='utf-8') as f: json.dump(data, f, indent=4)
-        os.replace(temp_filepath, filepath)
-    except Exception as e:
-        print(f"Erreur critique sauvegarde {filepath}: {e}"); traceback.print_exc()
+
+# --- Dépendances ---
+from utils.settings_store import settings_store
+from utils.transcripts import TRANSCRIPTS_DIR, write_transcript
 
 # --- Vues Persistantes (inchangées) ---
 class TicketPanelView(discord.ui.View):
@@ -47,16 +27,15 @@ class TicketCloseView(discord.ui.View):
 class SuggestionsTicketsCog(commands.Cog, name="Suggestions & Tickets"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.settings = load_data(SETTINGS_FILE)
         self.bot.add_view(TicketPanelView())
         self.bot.add_view(TicketCloseView())
 
-    def get_guild_settings(self, guild_id: int) -> dict:
-        guild_id_str = str(guild_id)
-        guild_data = self.settings.setdefault(guild_id_str, {})
-        guild_data.setdefault("suggestions_config", {})
-        guild_data.setdefault("ticket_config", {})
-        return guild_data
+    async def cog_unload(self):
+        await settings_store.flush()
+
+    def get_ticket_config(self, guild_id: int):
+        """Instantané (lecture seule) de la config tickets, sans relire le fichier."""
+        return settings_store.get_section(guild_id, "ticket_config")
 
     # --- Groupe de commandes SUGGESTIONS (inchangé) ---
     suggestions_group = app_commands.Group(name="suggestions", description="Commandes liées aux suggestions.")
@@ -67,19 +46,21 @@ class SuggestionsTicketsCog(commands.Cog, name="Suggestions & Tickets"):
     
     @ticket_group.command(name="config", description="[Admin] Configure la catégorie et le rôle pour les tickets.")
     @app_commands.checks.has_permissions(administrator=True)
-    async def ticket_config(self, interaction: discord.Interaction, categorie: discord.CategoryChannel, role_support: discord.Role):
+    @app_commands.describe(salon_transcripts="Salon où envoyer le transcript des tickets fermés (optionnel).")
+    async def ticket_config(self, interaction: discord.Interaction, categorie: discord.CategoryChannel, role_support: discord.Role,
+                            salon_transcripts: Optional[discord.TextChannel] = None):
         await interaction.response.defer(ephemeral=True)
         try:
-            guild_settings = self.get_guild_settings(interaction.guild.id)
-            config = guild_settings["ticket_config"]
-            config["ticket_category_id"] = categorie.id
-            config["support_role_id"] = role_support.id
-            save_data(SETTINGS_FILE, self.settings)
+            async with settings_store.edit(interaction.guild.id, "ticket_config") as config:
+                config["ticket_category_id"] = categorie.id
+                config["support_role_id"] = role_support.id
+                config["transcript_channel_id"] = salon_transcripts.id if salon_transcripts else None
 
             await interaction.followup.send(
                 f"✅ Configuration des tickets enregistrée !\n"
                 f"- **Catégorie :** `{categorie.name}`\n"
-                f"- **Rôle Support :** `{role_support.name}`",
+                f"- **Rôle Support :** `{role_support.name}`\n"
+                f"- **Transcripts :** {salon_transcripts.mention if salon_transcripts else '`non envoyés`'}",
                 ephemeral=True
             )
         except Exception as e:
@@ -91,8 +72,7 @@ class SuggestionsTicketsCog(commands.Cog, name="Suggestions & Tickets"):
     async def ticket_setup(self, interaction: discord.Interaction, salon: discord.TextChannel):
         await interaction.response.defer(ephemeral=True)
         try:
-            guild_settings = self.get_guild_settings(interaction.guild.id)
-            config = guild_settings.get("ticket_config", {})
+            config = self.get_ticket_config(interaction.guild.id)
             
             if not config.get("ticket_category_id") or not config.get("support_role_id"):
                 return await interaction.followup.send("❌ Veuillez d'abord configurer le système avec `/ticket config`.", ephemeral=True)
@@ -119,9 +99,7 @@ class SuggestionsTicketsCog(commands.Cog, name="Suggestions & Tickets"):
         # ==============================================================================
         # --- CORRECTION APPLIQUÉE ICI ---
         try:
-            self.settings = load_data(SETTINGS_FILE)
-            guild_settings = self.get_guild_settings(interaction.guild.id)
-            config = guild_settings.get("ticket_config", {})
+            config = self.get_ticket_config(interaction.guild.id)
             category_id = config.get("ticket_category_id")
             support_role_id = config.get("support_role_id")
             
@@ -159,9 +137,7 @@ class SuggestionsTicketsCog(commands.Cog, name="Suggestions & Tickets"):
             # La réponse doit être faite avant toute opération potentiellement lente
             await interaction.response.defer(ephemeral=True)
             
-            self.settings = load_data(SETTINGS_FILE)
-            guild_settings = self.get_guild_settings(interaction.guild.id)
-            config = guild_settings.get("ticket_config", {})
+            config = self.get_ticket_config(interaction.guild.id)
             support_role = interaction.guild.get_role(config.get("support_role_id"))
             
             if support_role and support_role not in interaction.user.roles and not interaction.user.guild_permissions.administrator:
@@ -169,15 +145,43 @@ class SuggestionsTicketsCog(commands.Cog, name="Suggestions & Tickets"):
 
             await interaction.followup.send("🔒 Fermeture du ticket en cours...", ephemeral=True)
             
-            transcript_messages = [f"Transcript du ticket #{interaction.channel.name}\n\n"]
-            async for message in interaction.channel.history(limit=None, oldest_first=True):
-                transcript_messages.append(f"[{message.created_at.strftime('%H:%M:%S')}] {message.author}: {message.content}\n")
-            transcript_file = io.StringIO("".join(transcript_messages))
-            
-            await interaction.channel.delete(reason=f"Ticket fermé par {interaction.user}")
+            channel = interaction.channel
+            # Transcript écrit message par message dans un fichier compressé (mémoire bornée, voir utils.transcripts)
+            path = os.path.join(TRANSCRIPTS_DIR, f"{interaction.guild.id}-{channel.id}.txt.gz")
+            try:
+                stats = await write_transcript(channel.history(limit=None, oldest_first=True), path,
+                                               f"Transcript du ticket #{channel.name} (fermé par {interaction.user})\n")
+            except Exception:
+                print(f"--- ERREUR transcript du ticket #{channel.name} ---"); traceback.print_exc()
+                return await interaction.followup.send("❌ Impossible d'enregistrer le transcript : le ticket n'a pas été supprimé.", ephemeral=True)
+
+            await self.upload_transcript(interaction.guild, config, channel, interaction.user, stats)
+            await channel.delete(reason=f"Ticket fermé par {interaction.user}")
         except Exception as e:
             print(f"--- ERREUR DANS handle_close_ticket ---"); traceback.print_exc()
 
+    async def upload_transcript(self, guild: discord.Guild, config, channel: discord.TextChannel, closed_by: discord.Member, stats):
+        """Envoie le transcript dans le salon configuré ; le fichier n'est gardé sur disque que si l'envoi échoue."""
+        log_channel = guild.get_channel(config.get("transcript_channel_id") or 0)
+        if not log_channel:
+            print(f"Transcript de #{channel.name} conservé dans {stats.path} (aucun salon de transcripts configuré).")
+            return
+        try:
+            if stats.compressed_bytes > guild.filesize_limit:
+                print(f"Transcript de #{channel.name} trop volumineux pour Discord, conservé dans {stats.path}.")
+                await log_channel.send(f"📄 Transcript de `#{channel.name}` trop volumineux pour être envoyé, conservé sur le serveur du bot.")
+                return
+            await log_channel.send(
+                f"📄 Transcript de `#{channel.name}`, fermé par {closed_by.mention} : "
+                f"{stats.messages} message(s), {stats.attachments} pièce(s) jointe(s), {stats.embeds} embed(s).",
+                file=discord.File(stats.path, filename=f"transcript-{channel.name}.txt.gz"),
+                allowed_mentions=discord.AllowedMentions.none()
+            )
+        except discord.HTTPException as e:
+            print(f"Envoi du transcript de #{channel.name} impossible ({e}), conservé dans {stats.path}.")
+            return
+        os.remove(stats.path)
+
 # --- Setup du Cog (inchangé) ---
 async def setup(bot: commands.Bot):
     await bot.add_cog(SuggestionsTicketsCog(bot))
@@ -0,0 +1,136 @@
+# utils/scheduler.py
+import asyncio
+import heapq
+import itertools
+import time
+import traceback
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+# --- Constantes ---
+DEFAULT_MAX_CONCURRENCY = 10
+MAX_SLEEP_SECONDS = 300  # Réveil de sécurité (changement d'heure système, etc.)
+
+Handler = Callable[[Hashable, Any], Awaitable[None]]
+
+class DeadlineScheduler:
+    """
+    Planificateur en mémoire : un tas trié par échéance (timestamp Unix) et une seule tâche
+    qui dort jusqu'à la prochaine échéance, au lieu d'interroger la base à intervalle fixe.
+
+    - schedule(key, due_at, payload) ajoute ou replace une échéance ; cancel(key) l'annule.
+    - Les échéances arrivées en même temps sont traitées en parallèle, limitées par un sémaphore.
+    - stats() expose le retard (lag) entre l'échéance et le déclenchement effectif.
+    """
+    def __init__(self, handler: Handler, max_concurrency: int = DEFAULT_MAX_CONCURRENCY, name: str = "scheduler"):
+        self.handler = handler
+        self.name = name
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._entries: Dict[Hashable, Tuple[float, int, Any]] = {}  # key -> (due_at, seq, payload)
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._runner: Optional[asyncio.Task] = None
+        self._running_tasks: set = set()
+        # Métriques
+        self.fired = 0
+        self.failed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._total_lag = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def schedule(self, key: Hashable, due_at: float, payload: Any = None):
+        seq = next(self._counter)
+        self._entries[key] = (due_at, seq, payload)
+        heapq.heappush(self._heap, (due_at, seq, key))
+        # Réveille la boucle si cette échéance passe avant celle qu'elle attend
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def cancel(self, key: Hashable) -> bool:
+        # Suppression paresseuse : l'entrée du tas est ignorée quand elle ressort
+        return self._entries.pop(key, None) is not None
+
+    def next_due(self) -> Optional[float]:
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _discard_stale(self):
+        while self._heap:
+            due_at, seq, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == seq:
+                return
+            heapq.heappop(self._heap)
+
+    def start(self):
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run(), name=self.name)
+
+    async def stop(self):
+        """Arrête la boucle et attend la fin des traitements en cours."""
+        if self._runner:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        if self._running_tasks:
+            await asyncio.gather(*self._running_tasks, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            next_due = self.next_due()
+            delay = MAX_SLEEP_SECONDS if next_due is None else next_due - time.time()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, MAX_SLEEP_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                due_at, seq, key = heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is None or entry[1] != seq:
+                    continue
+                del self._entries[key]
+                await self._semaphore.acquire()
+                task = asyncio.create_task(self._fire(key, due_at, entry[2]))
+                self._running_tasks.add(task)
+                task.add_done_callback(self._running_tasks.discard)
+
+    async def _fire(self, key: Hashable, due_at: float, payload: Any):
+        try:
+            lag = max(time.time() - due_at, 0.0)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self._total_lag += lag
+            self.fired += 1
+            await self.handler(key, payload)
+        except Exception as e:
+            self.failed += 1
+            print(f"ERREUR dans le planificateur '{self.name}' pour {key}: {e}"); traceback.print_exc()
+        finally:
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        next_due = self.next_due()
+        return {
+            "pending": len(self._entries),
+            "running": len(self._running_tasks),
+            "fired": self.fired,
+            "failed": self.failed,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "avg_lag": self._total_lag / self.fired if self.fired else 0.0,
+            "next_due_in": max(next_due - time.time(), 0.0) if next_due is not None else None,
+        }
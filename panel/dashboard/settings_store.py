@@ -0,0 +1,150 @@
+# utils/settings_store.py
+import asyncio
+import json
+import os
+import traceback
+from contextlib import asynccontextmanager
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+# --- Constantes ---
+DATA_DIR = './data'
+SETTINGS_FILE = os.path.join(DATA_DIR, 'settings.json')
+SAVE_DEBOUNCE_SECONDS = 2.0
+SAVE_RETRY_MAX_SECONDS = 60.0  # Délai maximal entre deux essais après un échec d'écriture
+
+Listener = Callable[[int, str, Mapping], Union[None, Awaitable[None]]]
+
+def deep_freeze(value: Any) -> Any:
+    """Copie en lecture seule : dict -> MappingProxyType, list -> tuple, récursivement."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: deep_freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(deep_freeze(item) for item in value)
+    return value
+
+class SettingsStore:
+    """
+    Source unique de data/settings.json partagée par tous les cogs.
+
+    - Lecture : get_section() retourne un instantané entièrement en lecture seule (listes et dicts
+      imbriqués compris), mis en cache jusqu'à la prochaine modification, sans relire le fichier.
+    - Écriture : `async with settings_store.edit(guild_id, "ticket_config") as config:` fournit
+      une copie modifiable qui remplace la section à la sortie du bloc (copy-on-write),
+      les instantanés déjà distribués ne changent donc jamais. Les éditions d'une même section
+      sont sérialisées (verrou par serveur et section) : ne pas attendre Discord dans le bloc.
+    - Une section inchangée à la sortie du bloc n'est ni publiée ni sauvegardée.
+    - Les écritures disque sont regroupées (debounce) et faites hors de la boucle asyncio.
+    - subscribe() permet d'être prévenu des changements d'une section.
+    """
+    def __init__(self, filepath: str = SETTINGS_FILE):
+        self.filepath = filepath
+        self._data: Optional[Dict[str, Dict[str, dict]]] = None
+        self._frozen: Dict[Tuple[str, str], Mapping[str, Any]] = {}  # Instantanés distribués par get_section
+        self._edit_locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._listeners: Dict[str, List[Listener]] = {}
+        self._save_task: Optional[asyncio.Task] = None
+        self._dirty = False
+        self._write_lock = asyncio.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, dict]]:
+        if self._data is None:
+            try:
+                with open(self.filepath, 'r', encoding='utf-8') as f:
+                    self._data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._data = {}
+            except Exception as e:
+                print(f"Erreur chargement {self.filepath}: {e}"); traceback.print_exc()
+                self._data = {}
+        return self._data
+
+    def get_section(self, guild_id: int, section: str, defaults: Optional[dict] = None) -> Mapping[str, Any]:
+        """Instantané en lecture seule d'une section ; `defaults` complète les clés absentes."""
+        key = (str(guild_id), section)
+        config = self._frozen.get(key)
+        if config is None:
+            config = self._frozen[key] = deep_freeze(self._load().get(key[0], {}).get(section, {}))
+        if defaults:
+            config = MappingProxyType({**deep_freeze(defaults), **config})
+        return config
+
+    @asynccontextmanager
+    async def edit(self, guild_id: int, section: str):
+        """Copie modifiable d'une section, publiée (et sauvegardée) à la sortie du bloc sans erreur, si elle a changé."""
+        guild_key = str(guild_id)
+        lock = self._edit_locks.setdefault((guild_key, section), asyncio.Lock())
+        async with lock:
+            data = self._load()
+            current = data.get(guild_key, {}).get(section, {})
+            new_config = json.loads(json.dumps(current))
+            yield new_config
+            if new_config == current:
+                return
+            data[guild_key] = {**data.get(guild_key, {}), section: new_config}
+            self._frozen.pop((guild_key, section), None)
+            self._schedule_save()
+        # Hors du verrou : un listener peut lui-même éditer la section
+        await self._notify(guild_id, section, self.get_section(guild_id, section))
+
+    def subscribe(self, section: str, listener: Listener):
+        """Enregistre un callback (sync ou async) appelé avec (guild_id, section, nouvelle_config)."""
+        self._listeners.setdefault(section, []).append(listener)
+
+    def unsubscribe(self, section: str, listener: Listener):
+        listeners = self._listeners.get(section, [])
+        if listener in listeners:
+            listeners.remove(listener)
+
+    async def _notify(self, guild_id: int, section: str, config: Mapping):
+        for listener in list(self._listeners.get(section, [])):
+            try:
+                result = listener(guild_id, section, config)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                print(f"Erreur dans un listener de settings ({section}): {e}"); traceback.print_exc()
+
+    # --- Écriture disque ---
+    def _schedule_save(self):
+        self._dirty = True
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._delayed_save())
+
+    async def _delayed_save(self):
+        # Une modification arrivée pendant une écriture remet `_dirty` : on réécrit avant de rendre la main.
+        # Après un échec, `_dirty` reste vrai et on réessaie avec un délai croissant.
+        delay = SAVE_DEBOUNCE_SECONDS
+        while self._dirty:
+            await asyncio.sleep(delay)
+            delay = SAVE_DEBOUNCE_SECONDS if await self.flush() else min(delay * 2, SAVE_RETRY_MAX_SECONDS)
+
+    async def flush(self) -> bool:
+        """
+        Écrit immédiatement l'état courant sur disque (à appeler aussi à l'arrêt). Retourne False si
+        l'écriture a échoué : l'erreur est affichée et l'état reste à sauvegarder.
+        """
+        if self._data is None:
+            return True
+        async with self._write_lock:
+            # Les sections ne sont jamais modifiées sur place : une copie du premier niveau suffit
+            self._dirty = False
+            snapshot = dict(self._data)
+            try:
+                await asyncio.to_thread(self._write_file, snapshot)
+            except Exception as e:
+                self._dirty = True
+                print(f"Erreur critique sauvegarde {self.filepath}: {e}"); traceback.print_exc()
+                return False
+        return True
+
+    def _write_file(self, data: dict):
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        temp_filepath = self.filepath + ".tmp"
+        with open(temp_filepath, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+        os.replace(temp_filepath, self.filepath)
+
+
+# --- Instance Globale ---
+settings_store = SettingsStore()
@@ -0,0 +1,110 @@
+# utils/spam_detector.py
+import time
+import zlib
+from collections import OrderedDict, deque
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+# --- Constantes ---
+DEFAULT_SPAM_CONFIG = {
+    "spam_message_count": 5,     # Messages...
+    "spam_timeframe": 10,        # ...en autant de secondes
+    "spam_duplicate_count": 3,   # Messages identiques dans la même fenêtre
+    "spam_mention_limit": 8,     # Mentions cumulées dans la même fenêtre
+}
+MAX_WINDOW_SIZE = 20             # Taille maximale des tampons circulaires, quelle que soit la config
+IDLE_TTL_SECONDS = 120           # Un membre silencieux depuis ce délai n'est plus suivi
+MAX_TRACKED_MEMBERS = 50_000     # Plafond mémoire : au-delà, les moins récemment actifs sont oubliés
+
+class _MemberWindow:
+    """Fenêtre glissante d'un membre : tampons circulaires de taille fixe (deque(maxlen=...))."""
+    __slots__ = ("timestamps", "hashes", "mentions")
+
+    def __init__(self, size: int):
+        self.timestamps = deque(maxlen=size)
+        self.hashes = deque(maxlen=size)
+        self.mentions = deque(maxlen=size)
+
+class SpamDetector:
+    """
+    Détecte trois formes de spam par (guild_id, user_id) sur une fenêtre glissante :
+    rafale de messages, messages identiques répétés et mentions en masse.
+
+    La mémoire est bornée : chaque membre suivi occupe au plus trois tampons de MAX_WINDOW_SIZE
+    entrées, les membres inactifs sont oubliés (balayage par ordre d'activité, O(nombre évincé))
+    et le nombre de membres suivis ne dépasse jamais `max_tracked`.
+    """
+    def __init__(self, max_tracked: int = MAX_TRACKED_MEMBERS, idle_ttl: float = IDLE_TTL_SECONDS):
+        self.max_tracked = max_tracked
+        self.idle_ttl = idle_ttl
+        self._windows: "OrderedDict[Tuple[int, int], _MemberWindow]" = OrderedDict()  # Du moins au plus récemment actif
+        self.idle_evictions = 0
+        self.capacity_evictions = 0
+        self.detections = {"flood": 0, "duplicate": 0, "mentions": 0}
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def check(self, guild_id: int, user_id: int, content: str, mention_count: int,
+              config: Optional[Mapping] = None, now: Optional[float] = None) -> Optional[str]:
+        """Enregistre un message et retourne "flood", "duplicate", "mentions" ou None."""
+        now = time.monotonic() if now is None else now
+        config = {name: (config or {}).get(name, default) for name, default in DEFAULT_SPAM_CONFIG.items()}
+        self.evict_idle(now)
+
+        key = (guild_id, user_id)
+        window = self._windows.get(key)
+        if window is None:
+            if len(self._windows) >= self.max_tracked:
+                self._windows.popitem(last=False)
+                self.capacity_evictions += 1
+            window = self._windows[key] = _MemberWindow(MAX_WINDOW_SIZE)
+        else:
+            self._windows.move_to_end(key)
+
+        window.timestamps.append(now)
+        window.hashes.append(zlib.crc32(content.strip().lower().encode()) if content else None)
+        window.mentions.append(mention_count)
+
+        since = now - config["spam_timeframe"]
+        recent = 0
+        for timestamp in reversed(window.timestamps):
+            if timestamp < since:
+                break
+            recent += 1
+
+        reason = None
+        message_count = min(config["spam_message_count"], MAX_WINDOW_SIZE)
+        if recent >= message_count:
+            reason = "flood"
+        elif content and list(window.hashes)[-recent:].count(window.hashes[-1]) >= config["spam_duplicate_count"]:
+            reason = "duplicate"
+        elif sum(list(window.mentions)[-recent:]) >= config["spam_mention_limit"]:
+            reason = "mentions"
+        if reason:
+            self.detections[reason] += 1
+        return reason
+
+    def reset(self, guild_id: int, user_id: int):
+        """Oublie la fenêtre d'un membre (après sanction, pour ne pas le sanctionner à chaque message)."""
+        self._windows.pop((guild_id, user_id), None)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        while self._windows:
+            key, window = next(iter(self._windows.items()))
+            if now - window.timestamps[-1] < self.idle_ttl:
+                break
+            del self._windows[key]
+            evicted += 1
+        self.idle_evictions += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked": len(self._windows),
+            "max_tracked": self.max_tracked,
+            "idle_evictions": self.idle_evictions,
+            "capacity_evictions": self.capacity_evictions,
+            "detections": dict(self.detections),
+        }
@@ -0,0 +1,103 @@
+# utils/transcripts.py
+import asyncio
+import datetime
+import gzip
+import os
+import time
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import AsyncIterable, List
+
+# --- Constantes ---
+DATA_DIR = './data'
+TRANSCRIPTS_DIR = os.path.join(DATA_DIR, 'transcripts')
+TRANSCRIPT_FLUSH_LINES = 200  # Lignes gardées en mémoire avant d'être compressées sur disque
+EMBED_DESCRIPTION_PREVIEW = 200
+
+@dataclass
+class TranscriptStats:
+    path: str
+    messages: int = 0
+    attachments: int = 0
+    embeds: int = 0
+    compressed_bytes: int = 0
+
+def format_message(message) -> List[str]:
+    """Lignes d'un message : en-tête + contenu, puis une ligne par pièce jointe et par embed."""
+    content = (message.content or "").replace("\n", "\n    ")
+    lines = [f"[{message.created_at:%Y-%m-%d %H:%M:%S}] {message.author} ({message.author.id}): {content}"]
+    for attachment in message.attachments:
+        lines.append(f"    📎 {attachment.filename} ({attachment.size} o, {attachment.content_type or 'type inconnu'}) {attachment.url}")
+    for embed in message.embeds:
+        description = (embed.description or "").replace("\n", " ")[:EMBED_DESCRIPTION_PREVIEW]
+        lines.append(f"    🧩 Embed : {embed.title or 'sans titre'} | {description} ({len(embed.fields)} champ(s))")
+    return lines
+
+async def write_transcript(messages: AsyncIterable, path: str, header: str) -> TranscriptStats:
+    """
+    Écrit les messages au fil de l'eau dans un fichier texte compressé (gzip). Seules
+    TRANSCRIPT_FLUSH_LINES lignes sont en mémoire à la fois, quelle que soit la longueur du ticket,
+    et la compression / l'écriture disque se font hors de la boucle asyncio.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    stats = TranscriptStats(path)
+    file = await asyncio.to_thread(gzip.open, path, 'wt', encoding='utf-8')
+    try:
+        buffer = [header]
+        async for message in messages:
+            buffer.extend(format_message(message))
+            stats.messages += 1
+            stats.attachments += len(message.attachments)
+            stats.embeds += len(message.embeds)
+            if len(buffer) >= TRANSCRIPT_FLUSH_LINES:
+                await asyncio.to_thread(file.write, "\n".join(buffer) + "\n")
+                buffer = []
+        buffer.append(f"--- {stats.messages} message(s), {stats.attachments} pièce(s) jointe(s), {stats.embeds} embed(s) ---")
+        await asyncio.to_thread(file.write, "\n".join(buffer) + "\n")
+    finally:
+        await asyncio.to_thread(file.close)
+    stats.compressed_bytes = os.path.getsize(path)
+    return stats
+
+
+# --- Benchmark (historique simulé) ---
+class _BenchAuthor:
+    id = 1234567890
+    def __str__(self) -> str:
+        return "membre_test"
+
+async def _fake_history(count: int):
+    author = _BenchAuthor()
+    start = datetime.datetime.now(datetime.timezone.utc)
+    for i in range(count):
+        attachments = [SimpleNamespace(filename=f"capture-{i}.png", size=48213, content_type="image/png",
+                                       url=f"https://cdn.example/{i}.png")] if i % 20 == 0 else []
+        embeds = [SimpleNamespace(title="Aperçu", description="Lien partagé dans le ticket", fields=[])] if i % 50 == 0 else []
+        yield SimpleNamespace(content=f"Message {i} : le souci persiste après redémarrage, voir détails.",
+                              created_at=start + datetime.timedelta(seconds=i), author=author,
+                              attachments=attachments, embeds=embeds)
+
+def benchmark_transcripts(sizes=(1_000, 10_000, 100_000)):
+    """Pic mémoire (tracemalloc) et taille compressée pour des tickets de plus en plus longs : le pic doit rester plat."""
+    import tempfile
+    import tracemalloc
+
+    async def main():
+        results = []
+        with tempfile.TemporaryDirectory() as directory:
+            for count in sizes:
+                path = os.path.join(directory, f"bench-{count}.txt.gz")
+                tracemalloc.start()
+                start = time.perf_counter()
+                stats = await write_transcript(_fake_history(count), path, "Transcript de benchmark")
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results.append((count, peak, stats.compressed_bytes, elapsed))
+                print(f"{count:>7} messages : pic {peak / 1024:7.0f} Kio, fichier {stats.compressed_bytes / 1024:7.0f} Kio, {elapsed:.2f} s")
+        return results
+
+    return asyncio.run(main())
+
+if __name__ == "__main__":
+    benchmark_transcripts()
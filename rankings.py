@@ -0,0 +1,198 @@
+# utils/rankings.py
+import asyncio
+from bisect import bisect_left, insort
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+# --- Classements matérialisés ---
+# Chaque classement (xp, money, messages...) est tenu en mémoire par serveur dans une liste
+# triée découpée en blocs : mise à jour, rang et page en O(log n) + O(nombre de blocs).
+BUCKET_SIZE = 512
+
+class RankedSet:
+    """Ensemble membre -> score trié par score décroissant (égalité : plus petit ID d'abord)."""
+    def __init__(self, entries: Iterable[Tuple[int, int]] = ()):
+        self._scores: Dict[int, int] = {}
+        self._buckets: List[List[Tuple[int, int]]] = []
+        self._maxes: List[Tuple[int, int]] = []  # Dernière clé de chaque bloc
+        for member_id, score in entries:
+            self._scores[member_id] = score
+        keys = sorted((-score, member_id) for member_id, score in self._scores.items())
+        for i in range(0, len(keys), BUCKET_SIZE):
+            bucket = keys[i:i + BUCKET_SIZE]
+            self._buckets.append(bucket)
+            self._maxes.append(bucket[-1])
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, member_id: int) -> bool:
+        return member_id in self._scores
+
+    def score(self, member_id: int) -> Optional[int]:
+        return self._scores.get(member_id)
+
+    def _insert(self, key: Tuple[int, int]):
+        if not self._buckets:
+            self._buckets.append([key]); self._maxes.append(key); return
+        pos = bisect_left(self._maxes, key)
+        if pos == len(self._buckets):
+            pos -= 1
+        bucket = self._buckets[pos]
+        insort(bucket, key)
+        self._maxes[pos] = bucket[-1]
+        if len(bucket) > BUCKET_SIZE * 2:
+            half = len(bucket) // 2
+            self._buckets[pos:pos + 1] = [bucket[:half], bucket[half:]]
+            self._maxes[pos:pos + 1] = [bucket[half - 1], bucket[-1]]
+
+    def _delete(self, key: Tuple[int, int]):
+        pos = bisect_left(self._maxes, key)
+        bucket = self._buckets[pos]
+        del bucket[bisect_left(bucket, key)]
+        if bucket:
+            self._maxes[pos] = bucket[-1]
+        else:
+            del self._buckets[pos]; del self._maxes[pos]
+
+    def update(self, member_id: int, score: int):
+        old_score = self._scores.get(member_id)
+        if old_score == score:
+            return
+        if old_score is not None:
+            self._delete((-old_score, member_id))
+        self._scores[member_id] = score
+        self._insert((-score, member_id))
+
+    def increment(self, member_id: int, delta: int = 1) -> int:
+        new_score = self._scores.get(member_id, 0) + delta
+        self.update(member_id, new_score)
+        return new_score
+
+    def remove(self, member_id: int):
+        old_score = self._scores.pop(member_id, None)
+        if old_score is not None:
+            self._delete((-old_score, member_id))
+
+    def rank(self, member_id: int) -> Optional[int]:
+        """Rang (1 = premier) du membre, ou None s'il n'est pas classé."""
+        score = self._scores.get(member_id)
+        if score is None:
+            return None
+        key = (-score, member_id)
+        pos = bisect_left(self._maxes, key)
+        before = sum(len(bucket) for bucket in self._buckets[:pos])
+        return before + bisect_left(self._buckets[pos], key) + 1
+
+    def slice(self, start: int, count: int) -> List[Tuple[int, int]]:
+        """Retourne `count` couples (member_id, score) à partir de la position `start` (0 = premier)."""
+        result = []
+        for bucket in self._buckets:
+            if start >= len(bucket):
+                start -= len(bucket)
+                continue
+            for neg_score, member_id in bucket[start:start + count - len(result)]:
+                result.append((member_id, -neg_score))
+            start = 0
+            if len(result) >= count:
+                break
+        return result
+
+    def top(self, count: int = 10) -> List[Tuple[int, int]]:
+        return self.slice(0, count)
+
+    def page(self, page: int, per_page: int = 10) -> List[Tuple[int, int]]:
+        """Page numérotée à partir de 1."""
+        return self.slice(max(page - 1, 0) * per_page, per_page)
+
+    def page_count(self, per_page: int = 10) -> int:
+        return max(1, -(-len(self) // per_page))
+
+
+Loader = Callable[[int], Awaitable[Iterable[Tuple[int, int]]]]
+
+class RankingService:
+    """
+    Registre des classements par (tableau, serveur). Chaque cog enregistre un chargeur
+    pour son tableau ; le classement d'un serveur est chargé à la première lecture puis
+    tenu à jour par les appels update/increment/remove. Ceux qui arrivent pendant le
+    chargement sont mis de côté puis rejoués sur le classement chargé.
+    """
+    def __init__(self):
+        self._loaders: Dict[str, Loader] = {}
+        self._boards: Dict[Tuple[str, int], RankedSet] = {}
+        self._locks: Dict[Tuple[str, int], asyncio.Lock] = {}
+        # Mises à jour reçues pendant un chargement : (méthode de RankedSet, member_id, valeur)
+        self._pending: Dict[Tuple[str, int], List[tuple]] = {}
+
+    def register_board(self, board: str, loader: Loader):
+        self._loaders[board] = loader
+        self.invalidate(board)
+
+    def invalidate(self, board: str, guild_id: Optional[int] = None):
+        """Oublie un classement ; il sera rechargé à la prochaine lecture."""
+        for key in [k for k in self._boards if k[0] == board and (guild_id is None or k[1] == guild_id)]:
+            del self._boards[key]
+        # Un chargement en cours ne sera pas gardé en cache (il a pu lire des données d'avant l'invalidation)
+        for key in [k for k in self._pending if k[0] == board and (guild_id is None or k[1] == guild_id)]:
+            del self._pending[key]
+
+    async def get(self, board: str, guild_id: int) -> RankedSet:
+        key = (board, guild_id)
+        ranked = self._boards.get(key)
+        if ranked is not None:
+            return ranked
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            ranked = self._boards.get(key)
+            if ranked is None:
+                loader = self._loaders.get(board)
+                pending = self._pending[key] = []
+                try:
+                    ranked = RankedSet(await loader(guild_id) if loader else ())
+                finally:
+                    invalidated = self._pending.pop(key, None) is not pending
+                for method, member_id, *args in pending:
+                    getattr(ranked, method)(member_id, *args)
+                if not invalidated:
+                    self._boards[key] = ranked
+        return ranked
+
+    def discard_pending(self, board: str, guild_id: int):
+        """
+        À appeler par un chargeur au moment où il fige ce qu'il va retourner : les mises à jour reçues
+        jusque-là sont déjà comptées dans son résultat et ne doivent pas être rejouées une seconde fois.
+        """
+        pending = self._pending.get((board, guild_id))
+        if pending is not None:
+            pending.clear()
+
+    def _apply(self, board: str, guild_id: int, method: str, member_id: int, *args):
+        key = (board, guild_id)
+        ranked = self._boards.get(key)
+        if ranked is not None:
+            getattr(ranked, method)(member_id, *args)
+        elif key in self._pending:
+            self._pending[key].append((method, member_id, *args))
+
+    def update(self, board: str, guild_id: int, member_id: int, score: int):
+        """Met à jour un score ; sans effet si le classement de ce serveur n'est ni chargé ni en cours de chargement."""
+        self._apply(board, guild_id, "update", member_id, score)
+
+    def increment(self, board: str, guild_id: int, member_id: int, delta: int = 1):
+        self._apply(board, guild_id, "increment", member_id, delta)
+
+    def remove(self, board: str, guild_id: int, member_id: int):
+        self._apply(board, guild_id, "remove", member_id)
+
+    async def top(self, board: str, guild_id: int, count: int = 10) -> List[Tuple[int, int]]:
+        return (await self.get(board, guild_id)).top(count)
+
+    async def page(self, board: str, guild_id: int, page: int, per_page: int = 10) -> List[Tuple[int, int]]:
+        return (await self.get(board, guild_id)).page(page, per_page)
+
+    async def rank(self, board: str, guild_id: int, member_id: int) -> Optional[int]:
+        return (await self.get(board, guild_id)).rank(member_id)
+
+
+# --- Instance Globale ---
+rankings = RankingService()
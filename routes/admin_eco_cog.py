@@ -3,9 +3,17 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 from typing import Optional
+import asyncio
+import csv
+import datetime
+import os
+import tempfile
 
 # --- Dépendances ---
 from utils.database import db
+from utils.level_curve import to_total_xp, xp_to_next_level
+from utils.rankings import rankings
+from utils.settings_store import settings_store
 
 # --- Classe Cog ---
 class AdminEcoCog(commands.Cog, name="Administration Économie"):
@@ -37,25 +45,22 @@ class AdminEcoCog(commands.Cog, name="Administration Économie"):
             return
 
         try:
-            # Récupérer les données actuelles de l'utilisateur
-            user_data = await self.db.get_user_data(interaction.guild.id, membre.id)
-            current_xp = user_data.get("xp", 0)
-            new_xp = current_xp + montant
-            
-            # Récupérer le Cog de leveling pour recalculer le niveau
-            leveling_cog = self.bot.get_cog("Niveaux & XP") # Assurez-vous que le nom est correct
-            if not leveling_cog:
-                await interaction.response.send_message("❌ Erreur : Le module de leveling n'est pas chargé.", ephemeral=True)
-                return
-                
-            new_level = leveling_cog.calculate_level(new_xp)
-
-            # Mettre à jour la base de données
-            await self.db.update_user_xp(interaction.guild.id, membre.id, new_xp, new_level)
+            leveling_cog = self.bot.get_cog("Système de Niveaux")
+            if leveling_cog:
+                # Passer par le tampon du cog de leveling pour ne pas écraser des gains en attente
+                new_xp, new_level, levels_gained = await leveling_cog.xp_buffer.add_xp(interaction.guild.id, membre.id, montant)
+                await leveling_cog.xp_buffer.flush()
+                settings = await self.db.get_guild_settings(interaction.guild.id) or {}
+                leveling_config = settings.get("leveling_config") or {}
+                await leveling_cog.grant_level_rewards(membre, leveling_config, new_level - levels_gained, new_level)
+            else:
+                user_data = await self.db.add_xp(interaction.guild.id, membre.id, montant)
+                new_level, new_xp, levels_gained = user_data["level"], user_data["xp"], user_data["levels_gained"]
             
             await interaction.response.send_message(
                 f"✅ **{montant}** ✨ XP ont été ajoutés à {membre.mention}.\n"
-                f"Nouveau total : `{new_xp}` XP (Niveau `{new_level}`).",
+                f"Niveau `{new_level}` (+{levels_gained}) — `{new_xp}` XP dans ce niveau, "
+                f"encore `{xp_to_next_level(to_total_xp(new_level, new_xp))}` XP avant le suivant.",
                 ephemeral=True
             )
 
@@ -87,21 +92,12 @@ class AdminEcoCog(commands.Cog, name="Administration Économie"):
             return
 
         try:
-            # Récupérer les données actuelles
-            user_data = await self.db.get_user_data(interaction.guild.id, membre.id)
-            current_balance = user_data.get("balance", 0)
-            new_balance = current_balance + montant
-            
-            # Mettre à jour la base de données
-            await self.db.update_user_balance(interaction.guild.id, membre.id, new_balance)
+            new_balance = await self.db.credit(interaction.guild.id, membre.id, montant, "admin_grant",
+                                               counterparty_id=interaction.user.id)
+            rankings.update("money", interaction.guild.id, membre.id, new_balance)
 
-            # Récupérer la config pour l'affichage de la monnaie
-            # Vous pouvez créer une méthode db.get_economy_config() ou la charger depuis settings.json
-            currency_emoji = "💰" # Valeur par défaut
-            # economie_cog = self.bot.get_cog("Économie")
-            # if economie_cog:
-            #     config = economie_cog.get_guild_config(interaction.guild.id)
-            #     currency_emoji = config.get("currency_emoji", "💰")
+            config = settings_store.get_section(interaction.guild.id, "economy_config")
+            currency_emoji = config.get("currency_emoji", "💰")
 
             await interaction.response.send_message(
                 f"✅ **{montant}** {currency_emoji} ont été ajoutés à {membre.mention}.\n"
@@ -112,6 +108,46 @@ class AdminEcoCog(commands.Cog, name="Administration Économie"):
             await interaction.response.send_message("❌ Une erreur est survenue lors de la mise à jour du solde.", ephemeral=True)
             print(f"Erreur dans /admin-monnaie ajouter : {e}")
 
+    @admin_monnaie_group.command(name="verifier", description="Compare le solde d'un membre à celui reconstruit depuis le journal.")
+    @app_commands.describe(membre="Le membre à vérifier.")
+    async def admin_monnaie_verifier(self, interaction: discord.Interaction, membre: discord.Member):
+        balance = await self.db.get_balance(interaction.guild.id, membre.id)
+        rebuilt = await self.db.rebuild_balance(interaction.guild.id, membre.id)
+        status = "✅ Cohérent" if balance == rebuilt else "⚠️ Écart détecté"
+        await interaction.response.send_message(
+            f"{status} pour {membre.mention} : solde `{balance}`, journal `{rebuilt}`.", ephemeral=True
+        )
+
+    @admin_monnaie_group.command(name="exporter", description="Exporte le journal des mouvements de monnaie en CSV.")
+    async def admin_monnaie_exporter(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        filename = f"journal_monnaie_{interaction.guild.id}.csv"
+        count = 0
+        # Le CSV est écrit lot par lot dans un fichier temporaire : la mémoire ne dépend pas de la taille du journal
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, filename)
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["id", "user_id", "amount", "balance_after", "kind", "counterparty_id", "created_at"])
+                async for batch in self.db.iter_transactions(interaction.guild.id):
+                    rows = [[*row[:6], datetime.datetime.fromtimestamp(row[6], tz=datetime.timezone.utc).isoformat()]
+                            for row in batch]
+                    await asyncio.to_thread(writer.writerows, rows)
+                    count += len(batch)
+            try:
+                await interaction.followup.send(
+                    f"📄 {count} mouvement(s) exporté(s).",
+                    file=discord.File(path, filename=filename),
+                    ephemeral=True
+                )
+            except discord.HTTPException as e:
+                print(f"ERREUR envoi de l'export du journal ({interaction.guild.id}) : {e}")
+                size = os.path.getsize(path)
+                await interaction.followup.send(
+                    f"❌ Impossible d'envoyer l'export ({count} mouvement(s), {size / 1024 / 1024:.1f} Mio) : "
+                    f"Discord a répondu `{e.status} {e.text or e}`.", ephemeral=True
+                )
+
 # =============================================
 # ==           SETUP DU COG                  ==
 # =============================================
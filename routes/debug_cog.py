@@ -3,15 +3,59 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 
+# --- Dépendances ---
+from utils.jobs import job_queue
+
+def is_bot_owner():
+    """Équivalent de commands.is_owner() pour les commandes slash, qui ignorent les checks de `commands`."""
+    async def predicate(interaction: discord.Interaction) -> bool:
+        return await interaction.client.is_owner(interaction.user)
+    return app_commands.check(predicate)
+
 class DebugCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
     @app_commands.command(name="debug-hello", description="[Propriétaire] Un simple test pour voir si les commandes apparaissent.")
-    @commands.is_owner()
+    @is_bot_owner()
     async def debug_hello(self, interaction: discord.Interaction):
         await interaction.response.send_message("Bonjour ! La commande de débogage fonctionne !", ephemeral=True)
 
+    def get_schedulers(self) -> list:
+        """Planificateurs à afficher : [(libellé, DeadlineScheduler)]."""
+        return [("File de tâches (débans, ...)", job_queue.scheduler)]
+
+    @app_commands.command(name="debug-planificateurs", description="[Propriétaire] Affiche l'état et le retard des planificateurs.")
+    @is_bot_owner()
+    async def debug_planificateurs(self, interaction: discord.Interaction):
+        embed = discord.Embed(title="⏱️ Planificateurs", color=discord.Color.dark_grey())
+        for label, scheduler in self.get_schedulers():
+            stats = scheduler.stats()
+            next_due = f"{stats['next_due_in']:.0f}s" if stats['next_due_in'] is not None else "—"
+            embed.add_field(name=label, value=(
+                f"En attente : `{stats['pending']}` | En cours : `{stats['running']}` | Prochaine : `{next_due}`\n"
+                f"Déclenchés : `{stats['fired']}` (échecs : `{stats['failed']}`)\n"
+                f"Retard moyen : `{stats['avg_lag'] * 1000:.0f} ms` | max : `{stats['max_lag'] * 1000:.0f} ms`"
+            ), inline=False)
+        if not embed.fields:
+            embed.description = "Aucun planificateur actif."
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="debug-antispam", description="[Propriétaire] Affiche l'occupation du détecteur de spam.")
+    @is_bot_owner()
+    async def debug_antispam(self, interaction: discord.Interaction):
+        automod_cog = self.bot.get_cog("Auto-Modération")
+        if not automod_cog:
+            await interaction.response.send_message("Le cog d'auto-modération n'est pas chargé.", ephemeral=True); return
+        stats = automod_cog.spam_detector.stats()
+        detections = ", ".join(f"{kind} : `{count}`" for kind, count in stats["detections"].items())
+        await interaction.response.send_message(
+            f"Membres suivis : `{stats['tracked']}` / `{stats['max_tracked']}`\n"
+            f"Évictions : inactivité `{stats['idle_evictions']}`, plafond `{stats['capacity_evictions']}`\n"
+            f"Détections : {detections}",
+            ephemeral=True
+        )
+
 async def setup(bot: commands.Bot):
     await bot.add_cog(DebugCog(bot))
     print("[DIAGNOSTIC] Le Cog 'debug_cog.py' a été chargé par le bot.")
\ No newline at end of file
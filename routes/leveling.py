@@ -1,9 +1,182 @@
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
+from typing import Dict, Optional, Tuple
+import asyncio
 import json
 import random
 import time
+import traceback
+
+# --- Dépendances ---
+from utils.level_curve import apply_xp, to_total_xp, xp_to_next_level
+from utils.rankings import rankings
+
+# --- Constantes ---
+XP_FLUSH_INTERVAL_SECONDS = 30
+XP_FLUSH_THRESHOLD = 200  # Nombre d'utilisateurs modifiés déclenchant une écriture anticipée
+DEFAULT_XP_COOLDOWN_SECONDS = 60
+MAX_XP_COOLDOWN_SECONDS = 3600
+COOLDOWN_BUCKET_SECONDS = 60  # Granularité du balayage des cooldowns expirés
+
+# --- Cooldowns à expiration automatique ---
+class CooldownStore:
+    """
+    Cooldowns par (guild_id, user_id) qui s'effacent d'eux-mêmes : chaque entrée est rangée dans
+    le seau (génération) de sa minute d'expiration, et les seaux échus sont supprimés en bloc au plus
+    une fois par minute. La mémoire est proportionnelle aux membres actifs sur la dernière période
+    de cooldown, pas à tous ceux qui ont un jour écrit.
+    """
+    def __init__(self, bucket_seconds: int = COOLDOWN_BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self._expiries: Dict[Tuple[int, int], float] = {}
+        self._buckets: Dict[int, list] = {}  # numéro de seau -> clés expirant dans ce seau
+        self._next_sweep = 0.0
+
+    def __len__(self) -> int:
+        return len(self._expiries)
+
+    def try_acquire(self, guild_id: int, user_id: int, cooldown: float, now: Optional[float] = None) -> bool:
+        """Retourne True (et démarre un cooldown) si le membre n'est pas en cooldown."""
+        now = time.monotonic() if now is None else now
+        if now >= self._next_sweep:
+            self.sweep(now)
+        key = (guild_id, user_id)
+        expiry = self._expiries.get(key)
+        if expiry is not None and expiry > now:
+            return False
+        if cooldown > 0:
+            expiry = now + cooldown
+            self._expiries[key] = expiry
+            self._buckets.setdefault(int(expiry // self.bucket_seconds), []).append(key)
+        return True
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Supprime les seaux entièrement échus. Retourne le nombre d'entrées effacées."""
+        now = time.monotonic() if now is None else now
+        current_bucket = int(now // self.bucket_seconds)
+        removed = 0
+        for bucket in [b for b in self._buckets if b < current_bucket]:
+            for key in self._buckets.pop(bucket):
+                # La clé a pu être renouvelée depuis (elle est alors aussi dans un seau plus récent)
+                expiry = self._expiries.get(key)
+                if expiry is not None and expiry <= now:
+                    del self._expiries[key]
+                    removed += 1
+        self._next_sweep = (current_bucket + 1) * self.bucket_seconds
+        return removed
+
+def benchmark_cooldowns(distinct_users: int = 2_000_000, messages_per_second: int = 2000, cooldown: int = 60):
+    """
+    Simule `distinct_users` membres différents écrivant chacun une fois, au rythme indiqué, et relève
+    le nombre d'entrées et la mémoire suivie : l'occupation doit rester plate (≈ débit × cooldown).
+    """
+    import tracemalloc
+    store = CooldownStore()
+    tracemalloc.start()
+    samples = []
+    for i in range(distinct_users):
+        now = i / messages_per_second
+        store.try_acquire(1, i, cooldown, now=now)
+        if i % (distinct_users // 10) == 0:
+            samples.append((i, len(store), tracemalloc.get_traced_memory()[0]))
+    tracemalloc.stop()
+    for users, entries, memory in samples:
+        print(f"{users:>9} membres vus : {entries:>7} cooldowns actifs, {memory / 1024 / 1024:6.1f} Mio")
+    return samples
+
+# --- Tampon d'écriture de l'XP ---
+class XPBuffer:
+    """
+    Accumule les gains d'XP en mémoire par (guild_id, user_id) et les écrit en base
+    par lots, dans une seule transaction. Le passage de niveau est calculé
+    immédiatement sur l'état en mémoire ; la base reçoit des deltas (db.add_xp),
+    ce qui n'écrase pas une modification faite entre-temps par un autre chemin.
+    """
+    def __init__(self, db_manager, flush_threshold: int = XP_FLUSH_THRESHOLD):
+        self.db = db_manager
+        self.flush_threshold = flush_threshold
+        self._state: Dict[Tuple[int, int], list] = {}  # (guild_id, user_id) -> [xp, level]
+        self._deltas: Dict[Tuple[int, int], int] = {}  # XP gagnée (ou perdue) pas encore écrite
+        self._lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def _get_state(self, guild_id: int, user_id: int) -> list:
+        key = (guild_id, user_id)
+        state = self._state.get(key)
+        if state is None:
+            user_data = await self.db.get_user_data(guild_id, user_id)
+            # État = base + deltas pas encore écrits (l'état a pu être oublié avant leur écriture, voir flush_user)
+            level, xp, _ = apply_xp(user_data.get("level", 1), user_data.get("xp", 0), self._deltas.get(key, 0))
+            # Un autre message a pu charger l'utilisateur pendant l'attente
+            state = self._state.setdefault(key, [xp, level])
+        return state
+
+    async def add_xp(self, guild_id: int, user_id: int, amount: int) -> Tuple[int, int, int]:
+        """Ajoute de l'XP en mémoire. Retourne (xp, niveau, niveaux_gagnés)."""
+        key = (guild_id, user_id)
+        state = await self._get_state(guild_id, user_id)
+
+        old_total = to_total_xp(state[1], state[0])
+        state[1], state[0], levels_gained = apply_xp(state[1], state[0], amount)
+        new_total = to_total_xp(state[1], state[0])
+        rankings.update("xp", guild_id, user_id, new_total)
+
+        # Variation réelle (l'XP totale ne descend pas sous 0)
+        self._deltas[key] = self._deltas.get(key, 0) + new_total - old_total
+        if len(self._deltas) >= self.flush_threshold and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+        return state[0], state[1], levels_gained
+
+    async def flush_user(self, guild_id: int, user_id: int):
+        """
+        Écrit les gains en attente d'un membre et oublie son état en mémoire, qui sera relu en base.
+        À appeler avant et après une opération qui modifie son XP directement en base (achat en boutique).
+        """
+        key = (guild_id, user_id)
+        async with self._lock:
+            await self._write({key: self._deltas.pop(key, 0)})
+            self._state.pop(key, None)
+
+    async def flush(self):
+        """Écrit tous les gains en attente en base en une seule transaction."""
+        async with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            await self._write(deltas)
+
+    async def _write(self, deltas: Dict[Tuple[int, int], int]):
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        try:
+            async with self.db.transaction():
+                for (guild_id, user_id), delta in deltas.items():
+                    await self.db.add_xp(guild_id, user_id, delta)
+        except Exception:
+            # On garde les deltas pour la prochaine tentative
+            for key, delta in deltas.items():
+                self._deltas[key] = self._deltas.get(key, 0) + delta
+            raise
+        # Les entrées propres sont relues depuis la base au prochain message
+        for key in deltas:
+            if key not in self._deltas:
+                self._state.pop(key, None)
+
+    @property
+    def pending(self) -> int:
+        return len(self._deltas)
+
+def get_leveling_config(settings: Optional[dict]) -> dict:
+    """Extrait la section leveling_config des paramètres du serveur (déjà décodée par la DB)."""
+    if not settings:
+        return {}
+    config = settings.get("leveling_config") or {}
+    if isinstance(config, str):
+        try:
+            config = json.loads(config)
+        except json.JSONDecodeError:
+            config = {}
+    return config
 
 class LevelingCog(commands.Cog, name="Système de Niveaux"):
     # On crée un groupe de commandes principal /xp
@@ -12,8 +185,31 @@ class LevelingCog(commands.Cog, name="Système de Niveaux"):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.db = bot.db
-        # Cooldown pour éviter le spam d'XP (par utilisateur)
-        self.cooldowns = {}
+        # Cooldown pour éviter le spam d'XP (par membre et par serveur), effacé automatiquement
+        self.cooldowns = CooldownStore()
+        self.xp_buffer = XPBuffer(self.db)
+        rankings.register_board("xp", self.load_xp_ranking)
+        self.flush_xp_loop.start()
+
+    async def load_xp_ranking(self, guild_id: int):
+        # Les gains en attente doivent être en base avant de construire le classement
+        await self.xp_buffer.flush()
+        return [(user_id, to_total_xp(level, xp)) for user_id, level, xp in await self.db.get_guild_xp_rows(guild_id)]
+
+    async def cog_unload(self):
+        self.flush_xp_loop.cancel()
+        # Écriture garantie des gains en attente au déchargement / à l'arrêt
+        try:
+            await self.xp_buffer.flush()
+        except Exception as e:
+            print(f"ERREUR lors de l'écriture finale de l'XP : {e}"); traceback.print_exc()
+
+    @tasks.loop(seconds=XP_FLUSH_INTERVAL_SECONDS)
+    async def flush_xp_loop(self):
+        try:
+            await self.xp_buffer.flush()
+        except Exception as e:
+            print(f"ERREUR dans la boucle flush_xp_loop: {e}"); traceback.print_exc()
 
     # --- Listener pour donner de l'XP ---
     @commands.Cog.listener("on_message")
@@ -26,50 +222,42 @@ class LevelingCog(commands.Cog, name="Système de Niveaux"):
 
         # Récupérer la config du serveur
         settings = await self.db.get_guild_settings(guild_id)
-        if not settings or not json.loads(settings.get("leveling_config", "{}")).get("enabled", False):
+        leveling_config = get_leveling_config(settings)
+        if not leveling_config.get("enabled", False):
             return
 
-        # Gestion du Cooldown (1 minute par utilisateur)
-        now = time.time()
-        cooldown_key = f"{guild_id}-{user_id}"
-        if cooldown_key in self.cooldowns and now - self.cooldowns[cooldown_key] < 60:
+        # Gestion du Cooldown (1 minute par défaut, configurable par serveur)
+        cooldown = min(max(leveling_config.get("cooldown_seconds", DEFAULT_XP_COOLDOWN_SECONDS), 0), MAX_XP_COOLDOWN_SECONDS)
+        if not self.cooldowns.try_acquire(guild_id, user_id, cooldown):
             return
-        self.cooldowns[cooldown_key] = now
 
-        # Donner de l'XP
+        # Donner de l'XP (écriture différée, voir XPBuffer)
         xp_gain = random.randint(15, 25)
-        user_data = await self.db.get_user_data(guild_id, user_id)
-        
-        current_xp = user_data.get("xp", 0) + xp_gain
-        current_level = user_data.get("level", 1)
-        xp_needed = 5 * (current_level ** 2) + 50 * current_level + 100
+        current_xp, current_level, levels_gained = await self.xp_buffer.add_xp(guild_id, user_id, xp_gain)
 
         # Vérification du passage de niveau
-        if current_xp >= xp_needed:
-            current_level += 1
-            current_xp -= xp_needed
-            await self.db.update_user_xp(guild_id, user_id, current_xp, current_level)
-
+        if levels_gained > 0:
             # Annonce de level-up
-            leveling_config = json.loads(settings.get("leveling_config", "{}"))
             announcement_channel_id = leveling_config.get("announcement_channel")
             if announcement_channel_id:
                 channel = message.guild.get_channel(announcement_channel_id)
                 if channel:
                     await channel.send(f"🎉 Bravo {message.author.mention}, tu as atteint le niveau **{current_level}** !")
 
-            # Attribution des rôles récompenses
-            role_rewards = leveling_config.get("role_rewards", {})
-            if str(current_level) in role_rewards:
-                role_id = role_rewards[str(current_level)]
-                role = message.guild.get_role(role_id)
-                if role:
-                    try:
-                        await message.author.add_roles(role, reason=f"Récompense de niveau {current_level}")
-                    except discord.Forbidden:
-                        print(f"Permissions manquantes pour donner le rôle {role.name} sur le serveur {message.guild.name}")
-        else:
-            await self.db.update_user_xp(guild_id, user_id, current_xp, current_level)
+            await self.grant_level_rewards(message.author, leveling_config, current_level - levels_gained, current_level)
+
+    async def grant_level_rewards(self, member: discord.Member, leveling_config: dict, old_level: int, new_level: int):
+        """Attribue les rôles récompenses de tous les niveaux franchis entre old_level (exclu) et new_level."""
+        role_rewards = leveling_config.get("role_rewards", {})
+        for level in range(old_level + 1, new_level + 1):
+            if str(level) not in role_rewards:
+                continue
+            role = member.guild.get_role(role_rewards[str(level)])
+            if role:
+                try:
+                    await member.add_roles(role, reason=f"Récompense de niveau {level}")
+                except discord.Forbidden:
+                    print(f"Permissions manquantes pour donner le rôle {role.name} sur le serveur {member.guild.name}")
 
     # --- Commandes de Configuration ---
     @xp_group.command(name="config-annonces", description="[Admin] Définit le salon pour les annonces de passage de niveau.")
@@ -77,7 +265,7 @@ class LevelingCog(commands.Cog, name="Système de Niveaux"):
     async def config_announcements(self, interaction: discord.Interaction, salon: discord.TextChannel):
         await interaction.response.defer(ephemeral=True)
         settings = await self.db.get_guild_settings(interaction.guild.id)
-        config = json.loads(settings.get("leveling_config", "{}")) if settings else {}
+        config = get_leveling_config(settings)
         
         config["announcement_channel"] = salon.id
         await self.db.update_guild_setting(interaction.guild.id, "leveling_config", config)
@@ -93,7 +281,7 @@ class LevelingCog(commands.Cog, name="Système de Niveaux"):
             return await interaction.followup.send("❌ Je ne peux pas attribuer ce rôle car il est plus élevé que le mien dans la hiérarchie.", ephemeral=True)
 
         settings = await self.db.get_guild_settings(interaction.guild.id)
-        config = json.loads(settings.get("leveling_config", "{}")) if settings else {}
+        config = get_leveling_config(settings)
         
         if "role_rewards" not in config:
             config["role_rewards"] = {}
@@ -103,18 +291,66 @@ class LevelingCog(commands.Cog, name="Système de Niveaux"):
 
         await interaction.followup.send(f"✅ Le rôle {role.mention} sera maintenant donné au niveau **{niveau}**.", ephemeral=True)
 
+    @xp_group.command(name="config-cooldown", description="[Admin] Délai minimum entre deux gains d'XP d'un même membre.")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(secondes="Délai en secondes (0 = pas de délai).")
+    async def config_cooldown(self, interaction: discord.Interaction, secondes: app_commands.Range[int, 0, MAX_XP_COOLDOWN_SECONDS]):
+        await interaction.response.defer(ephemeral=True)
+        settings = await self.db.get_guild_settings(interaction.guild.id)
+        config = get_leveling_config(settings)
+
+        config["cooldown_seconds"] = secondes
+        await self.db.update_guild_setting(interaction.guild.id, "leveling_config", config)
+
+        await interaction.followup.send(f"✅ Délai entre deux gains d'XP : **{secondes}** seconde(s).", ephemeral=True)
+
     @xp_group.command(name="config-activer", description="[Admin] Active ou désactive le système de niveaux sur le serveur.")
     @app_commands.checks.has_permissions(administrator=True)
     async def config_toggle(self, interaction: discord.Interaction, statut: bool):
         await interaction.response.defer(ephemeral=True)
         settings = await self.db.get_guild_settings(interaction.guild.id)
-        config = json.loads(settings.get("leveling_config", "{}")) if settings else {}
+        config = get_leveling_config(settings)
 
         config["enabled"] = statut
         await self.db.update_guild_setting(interaction.guild.id, "leveling_config", config)
 
         message = "activé" if statut else "désactivé"
         await interaction.followup.send(f"✅ Le système de niveaux a été **{message}**.", ephemeral=True)
+
+    # --- Commandes de Classement ---
+    @xp_group.command(name="classement", description="Affiche le classement XP du serveur.")
+    @app_commands.describe(page="La page du classement à afficher.")
+    async def xp_leaderboard(self, interaction: discord.Interaction, page: app_commands.Range[int, 1, None] = 1):
+        ranked = await rankings.get("xp", interaction.guild.id)
+        if not len(ranked):
+            return await interaction.response.send_message("ℹ️ Personne n'a encore gagné d'XP.", ephemeral=True)
+
+        page = min(page, ranked.page_count())
+        start = (page - 1) * 10
+        description = ""
+        for i, (user_id, total_xp) in enumerate(ranked.page(page), start=start + 1):
+            description += f"**#{i}** <@{user_id}> - `{total_xp}` XP\n"
+        embed = discord.Embed(title=f"🏆 Classement XP de {interaction.guild.name}", description=description, color=discord.Color.gold())
+        embed.set_footer(text=f"Page {page}/{ranked.page_count()}")
+        await interaction.response.send_message(embed=embed, allowed_mentions=discord.AllowedMentions.none())
+
+    @xp_group.command(name="rang", description="Affiche ton rang XP ou celui d'un autre membre.")
+    @app_commands.describe(membre="Le membre dont voir le rang (optionnel).")
+    async def xp_rank(self, interaction: discord.Interaction, membre: Optional[discord.Member] = None):
+        membre = membre or interaction.user
+        ranked = await rankings.get("xp", interaction.guild.id)
+        rank = ranked.rank(membre.id)
+        if rank is None:
+            return await interaction.response.send_message(f"ℹ️ {membre.mention} n'a pas encore d'XP.", ephemeral=True)
+        total_xp = ranked.score(membre.id)
+        await interaction.response.send_message(
+            f"📊 {membre.mention} est **#{rank}** sur {len(ranked)} avec `{total_xp}` XP "
+            f"(encore `{xp_to_next_level(total_xp)}` XP avant le prochain niveau).",
+            allowed_mentions=discord.AllowedMentions.none()
+        )
         
 async def setup(bot: commands.Bot):
     await bot.add_cog(LevelingCog(bot))
+
+if __name__ == "__main__":
+    benchmark_cooldowns()
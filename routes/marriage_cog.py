@@ -159,10 +159,14 @@ class MarriageCog(commands.Cog, name="Système de Mariage"):
             target_id = int(partenaire)
             target_user = self.bot.get_user(target_id) or await self.bot.fetch_user(target_id)
             
-            if not await self.db.are_married(guild.id, author.id, target_id):
+            # Vérification et suppression dans la même transaction (la ligne couvre les deux sens du couple)
+            async with self.db.transaction():
+                married = await self.db.are_married(guild.id, author.id, target_id)
+                if married:
+                    await self.db.remove_marriage(guild.id, author.id, target_id)
+            if not married:
                 await interaction.response.send_message(f"❌ Vous n'êtes pas marié(e) avec {target_user.mention}.", ephemeral=True); return
 
-            await self.db.remove_marriage(guild.id, author.id, target_id)
             await interaction.response.send_message(f"💔 Vous avez divorcé de {target_user.mention}.", ephemeral=True)
 
         except ValueError:
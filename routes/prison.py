@@ -2,7 +2,7 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 import asyncio
 import traceback
 from datetime import datetime, timezone
@@ -10,10 +10,18 @@ import time
 import json # <-- Ajout de l'import json
 
 # --- Dépendances ---
+from utils.bulk_actions import bulk_executor
 from utils.database import db
+from utils.jobs import job_queue
 
 # --- Constantes ---
 PRISONER_ROLE_NAME = "Prisonnier"
+ROLE_SETUP_JOB = "prison_role_setup"
+RELEASE_JOB = "prison_release"
+MAX_SENTENCE_MINUTES = 525600  # 1 an
+
+def release_job_key(guild_id: int, user_id: int) -> str:
+    return f"{RELEASE_JOB}:{guild_id}:{user_id}"
 
 # --- Classe Cog -----
 class PrisonCog(commands.Cog, name="Système Prison"):
@@ -21,8 +29,112 @@ class PrisonCog(commands.Cog, name="Système Prison"):
         self.bot = bot
         self.db = db_manager
 
-    async def get_or_create_prisoner_role(self, guild: discord.Guild) -> Optional[discord.Role]:
-        """Trouve le rôle 'Prisonnier' ou le crée s'il n'existe pas."""
+    async def cog_load(self):
+        # La configuration des salons pour un nouveau rôle est une tâche de fond persistante (utils.jobs)
+        job_queue.register(ROLE_SETUP_JOB, self.handle_role_setup)
+        # Les fins de peine aussi : la file les recharge au démarrage et les déclenche à l'échéance
+        job_queue.register(RELEASE_JOB, self.handle_release)
+        await job_queue.start(self.bot)
+        await self.recover_sentences()
+
+    async def cog_unload(self):
+        job_queue.unregister(ROLE_SETUP_JOB)
+        job_queue.unregister(RELEASE_JOB)
+        await job_queue.stop_if_idle()
+
+    async def recover_sentences(self):
+        """
+        Replanifie en une passe les peines datées sans tâche de libération (tâche abandonnée, ligne
+        écrite hors du bot...). Les peines échues pendant une coupure partent ensemble dès le démarrage.
+        """
+        try:
+            orphans = await self.db.get_prisoners_without_job(RELEASE_JOB)
+        except Exception as e:
+            print(f"ERREUR récupération des peines de prison : {e}"); traceback.print_exc(); return
+        now = time.time()
+        for row in orphans:
+            await job_queue.enqueue(RELEASE_JOB, {"guild_id": row["guild_id"], "user_id": row["user_id"]},
+                                    row["release_at"], job_key=release_job_key(row["guild_id"], row["user_id"]))
+        if orphans:
+            overdue = sum(1 for row in orphans if row["release_at"] <= now)
+            print(f"PRISON: {len(orphans)} peine(s) replanifiée(s), dont {overdue} déjà échue(s).")
+
+    async def restore_member(self, guild: discord.Guild, membre: discord.Member, prisoner_data: dict, reason: str) -> Optional[str]:
+        """
+        Retire le rôle Prisonnier ou, pour un administrateur, restaure ses rôles sauvegardés.
+        Retourne un message d'erreur si une restauration manuelle est nécessaire. Lève discord.Forbidden.
+        """
+        saved_roles_json = prisoner_data.get("saved_roles")
+
+        # 1. Gérer la restauration des rôles pour un admin
+        if saved_roles_json:
+            try:
+                role_ids_to_restore = json.loads(saved_roles_json)
+            except json.JSONDecodeError:
+                return "Erreur critique: Impossible de lire les rôles sauvegardés. Restauration manuelle requise !"
+            roles_to_restore = [guild.get_role(rid) for rid in role_ids_to_restore if guild.get_role(rid) is not None]
+
+            # Vérifier si on peut bien assigner tous les rôles
+            if any(r >= guild.me.top_role for r in roles_to_restore):
+                return "Erreur: Un des rôles sauvegardés est plus haut que le mien. Restauration manuelle requise."
+            await membre.edit(roles=roles_to_restore, reason=f"{reason} (Admin)")
+
+        # 2. Gérer le cas non-admin (simple retrait du rôle)
+        else:
+            prisoner_role = discord.utils.get(guild.roles, name=PRISONER_ROLE_NAME)
+            if prisoner_role and prisoner_role in membre.roles:
+                await membre.remove_roles(prisoner_role, reason=reason)
+        return None
+
+    async def handle_release(self, payload: dict):
+        """Libération automatique en fin de peine (idempotent : rejouable après un redémarrage)."""
+        guild = self.bot.get_guild(payload["guild_id"])
+        if not guild:
+            return
+        prisoner_data = await self.db.get_prisoner_data(guild.id, payload["user_id"])
+        if not prisoner_data or prisoner_data.get("release_at") is None or prisoner_data["release_at"] > time.time() + 1:
+            return  # Déjà libéré, ou peine modifiée depuis (une autre tâche porte la nouvelle échéance)
+
+        membre = guild.get_member(payload["user_id"])
+        if membre is None:
+            try:
+                membre = await guild.fetch_member(payload["user_id"])
+            except discord.NotFound:
+                membre = None  # Parti du serveur : ses rôles ont disparu avec lui
+        if membre is not None:
+            # Après une coupure, les libérations échues partent ensemble : budget partagé par serveur
+            await bulk_executor.budget("member_roles", guild.id).acquire()
+            error = await self.restore_member(guild, membre, prisoner_data, "Fin de la peine de prison")
+            if error:
+                # Erreur définitive (rôles illisibles ou trop hauts) : la peine devient sans échéance, sinon
+                # recover_sentences la relancerait (et renverrait ce rapport) à chaque redémarrage
+                print(f"PRISON: Libération automatique de {membre} impossible sur {guild.name}: {error}")
+                await self.db.clear_prisoner_release(guild.id, payload["user_id"])
+                await self._report_to_moderator(guild, {**payload, "moderator_id": prisoner_data["moderator_id"]},
+                                                f"⚠️ Fin de peine de {membre.mention} : {error} "
+                                                f"La libération automatique est annulée, la peine reste active sans échéance.")
+                return
+        # Les autres discord.HTTPException (Forbidden compris) sont retentées par la file
+        await self.db.remove_prisoner(guild.id, payload["user_id"])
+
+        log_embed = discord.Embed(
+            title="⚖️ Membre Libéré",
+            description=f"<@{payload['user_id']}> a purgé sa peine et a été libéré automatiquement.",
+            color=discord.Color.green(),
+            timestamp=datetime.now(timezone.utc)
+        ).add_field(name="Raison initiale", value=prisoner_data.get("reason") or "N/A")
+        channel = guild.get_channel(payload.get("report_channel_id") or 0)
+        try:
+            if channel: await channel.send(embed=log_embed)
+        except discord.Forbidden: pass
+
+    async def get_or_create_prisoner_role(self, guild: discord.Guild, moderator_id: Optional[int] = None,
+                                          report_channel_id: Optional[int] = None,
+                                          skip_channel_ids: List[int] = ()) -> Optional[discord.Role]:
+        """
+        Trouve le rôle 'Prisonnier' ou le crée s'il n'existe pas. À la création, le masquage des salons
+        est confié à une tâche de fond (voir handle_role_setup) qui préviendra le modérateur.
+        """
         # Chercher le rôle
         role = discord.utils.get(guild.roles, name=PRISONER_ROLE_NAME)
         if role:
@@ -37,12 +149,12 @@ class PrisonCog(commands.Cog, name="Système Prison"):
                 permissions=no_perms,
                 reason="Création du rôle pour le système de prison"
             )
-            # Parcourir tous les canaux pour refuser explicitement la vue
-            for channel in guild.channels:
-                try:
-                    await channel.set_permissions(new_role, view_channel=False, reason="Configuration du rôle Prisonnier")
-                except discord.Forbidden:
-                    print(f"PRISON SETUP: Impossible de configurer les perms pour le rôle Prisonnier dans #{channel.name}")
+            payload = {
+                "guild_id": guild.id, "role_id": new_role.id, "moderator_id": moderator_id,
+                "report_channel_id": report_channel_id, "skip_channel_ids": list(skip_channel_ids),
+                "updated": 0, "failed": 0, "started_at": time.time(),
+            }
+            await job_queue.enqueue(ROLE_SETUP_JOB, payload, time.time(), job_key=f"{ROLE_SETUP_JOB}:{guild.id}")
             return new_role
         except discord.Forbidden:
             print("PRISON SETUP: Impossible de créer le rôle Prisonnier.")
@@ -50,14 +162,88 @@ class PrisonCog(commands.Cog, name="Système Prison"):
         except Exception as e:
             print(f"Erreur création rôle prisonnier: {e}"); traceback.print_exc(); return None
 
+    async def handle_role_setup(self, payload: dict):
+        """
+        Refuse la vue du rôle Prisonnier dans tous les salons, en parallèle (débit borné par bulk_executor).
+        Les catégories passent d'abord : leurs salons synchronisés héritent alors de la nouvelle permission
+        et ne sont pas réécrits, seuls les salons non synchronisés reçoivent leur propre permission.
+        Un salon où le rôle a déjà une permission de vue explicite est ignoré, ce qui permet de reprendre
+        après un redémarrage sans refaire le travail ; les compteurs sont sauvegardés dans la tâche.
+        """
+        guild = self.bot.get_guild(payload["guild_id"])
+        role = guild.get_role(payload["role_id"]) if guild else None
+        if not role:
+            return  # Serveur quitté ou rôle supprimé entre-temps
+        job_key = f"{ROLE_SETUP_JOB}:{guild.id}"
+        reason = "Configuration du rôle Prisonnier"
+        skip_ids = set(payload.get("skip_channel_ids", []))
+
+        def needs_update(channel) -> bool:
+            return channel.id not in skip_ids and channel.overwrites_for(role).view_channel is None
+
+        # Repéré avant toute modification de catégorie
+        synced_ids = {c.id for c in guild.channels if c.category and c.permissions_synced}
+        categories = [c for c in guild.categories if needs_update(c)]
+        others = [c for c in guild.channels if not isinstance(c, discord.CategoryChannel) and needs_update(c)]
+        # Les salons mis à jour avant un redémarrage sont déjà comptés dans payload["updated"]
+        skipped = max(len(guild.channels) - len(categories) - len(others) - payload["updated"], 0)
+
+        async def update(channel):
+            await channel.set_permissions(role, view_channel=False, reason=reason)
+
+        wall_time = 0.0
+        async def run_batch(batch) -> set:
+            """Traite un lot et retourne les IDs des salons mis à jour."""
+            nonlocal wall_time
+            if not batch:
+                return set()
+            report = await bulk_executor.run(guild.id, "channel_permissions", batch, update)
+            wall_time += report.wall_time
+            payload["updated"] += report.succeeded
+            payload["failed"] += len(report.failed)
+            for failure in report.failed:
+                print(f"PRISON SETUP: Impossible de configurer les perms pour le rôle Prisonnier dans #{failure.item.name} ({failure.error})")
+            await self.db.update_job_payload(job_key, payload)
+            return {result.item.id for result in report.results if result.ok}
+
+        # Catégories qui refusent la vue : mises à jour à l'instant, ou lors d'un passage précédent
+        denied_ids = await run_batch(categories)
+        denied_ids.update(c.id for c in guild.categories if c.overwrites_for(role).view_channel is False)
+        unsynced = [c for c in others if not (c.id in synced_ids and c.category_id in denied_ids)]
+        inherited = len(others) - len(unsynced)
+        await run_batch(unsynced)
+
+        summary = (f"🔒 Rôle {role.mention} configuré : **{payload['updated']}** salon(s) mis à jour, "
+                   f"**{inherited}** synchronisé(s) avec leur catégorie, "
+                   f"**{skipped}** déjà correct(s), **{payload['failed']}** échec(s) "
+                   f"({time.time() - payload['started_at']:.0f} s au total, {wall_time:.1f} s pour ce passage).")
+        print(f"PRISON SETUP ({guild.name}): {summary}")
+        await self._report_to_moderator(guild, payload, summary)
+
+    async def _report_to_moderator(self, guild: discord.Guild, payload: dict, message: str):
+        moderator_id = payload.get("moderator_id")
+        channel = guild.get_channel(payload.get("report_channel_id") or 0)
+        try:
+            if channel:
+                await channel.send(f"<@{moderator_id}> {message}" if moderator_id else message,
+                                   allowed_mentions=discord.AllowedMentions(users=True, roles=False))
+                return
+            moderator = guild.get_member(moderator_id) if moderator_id else None
+            if moderator:
+                await moderator.send(f"[{guild.name}] {message}", allowed_mentions=discord.AllowedMentions.none())
+        except discord.Forbidden:
+            pass
+
     @app_commands.command(name="prison", description="Envoie un membre en prison.")
     @app_commands.checks.has_permissions(administrator=True) # Requiert admin pour une action si disruptive
     @app_commands.checks.bot_has_permissions(manage_roles=True, manage_channels=True)
-    @app_commands.describe(membre="Le membre à emprisonner.", prison_channel="Le salon qui servira de prison.", raison="Raison de l'emprisonnement.")
+    @app_commands.describe(membre="Le membre à emprisonner.", prison_channel="Le salon qui servira de prison.", raison="Raison de l'emprisonnement.",
+                           duree_minutes="Durée de la peine en minutes (vide = jusqu'à /unprison).")
     async def prison_command(self, interaction: discord.Interaction,
                              membre: discord.Member,
                              prison_channel: discord.TextChannel,
-                             raison: str = "Mis en prison par la modération."):
+                             raison: str = "Mis en prison par la modération.",
+                             duree_minutes: Optional[app_commands.Range[int, 1, MAX_SENTENCE_MINUTES]] = None):
         
         guild = interaction.guild
         if membre == interaction.user or membre == self.bot.user:
@@ -69,8 +255,9 @@ class PrisonCog(commands.Cog, name="Système Prison"):
 
         await interaction.response.defer(thinking=True, ephemeral=True)
         
-        # 1. Obtenir/Créer le rôle Prisonnier
-        prisoner_role = await self.get_or_create_prisoner_role(guild)
+        # 1. Obtenir/Créer le rôle Prisonnier (le salon prison ne doit pas être masqué par la configuration)
+        prisoner_role = await self.get_or_create_prisoner_role(guild, interaction.user.id, interaction.channel_id,
+                                                               skip_channel_ids=[prison_channel.id])
         if not prisoner_role:
             await interaction.followup.send("❌ Erreur critique : Impossible de créer ou trouver le rôle 'Prisonnier'.", ephemeral=True); return
             
@@ -101,10 +288,20 @@ class PrisonCog(commands.Cog, name="Système Prison"):
             except discord.Forbidden:
                 await interaction.followup.send(f"❌ Je n'ai pas la permission d'ajouter des rôles à {membre.mention}.", ephemeral=True); return
 
-        # 4. Enregistrer dans la base de données
-        await self.db.add_prisoner(guild.id, membre.id, prison_channel.id, interaction.user.id, raison, saved_roles_json)
+        # 4. Enregistrer la peine et planifier (ou annuler) la libération automatique dans une seule transaction
+        release_at = time.time() + duree_minutes * 60 if duree_minutes else None
+        async with self.db.transaction():
+            await self.db.add_prisoner(guild.id, membre.id, prison_channel.id, interaction.user.id, raison, saved_roles_json, release_at)
+            if release_at:
+                await job_queue.enqueue(RELEASE_JOB, {"guild_id": guild.id, "user_id": membre.id, "report_channel_id": interaction.channel_id},
+                                        release_at, job_key=release_job_key(guild.id, membre.id))
+            else:
+                await job_queue.cancel(release_job_key(guild.id, membre.id))
 
         await interaction.followup.send(f"✅ **{membre.display_name}** a été emprisonné avec succès.", ephemeral=True)
+        if await self.db.get_job_by_key(f"{ROLE_SETUP_JOB}:{guild.id}"):
+            await interaction.followup.send("⏳ Le rôle Prisonnier est en cours de configuration sur les salons du serveur, "
+                                            "vous serez notifié une fois terminé.", ephemeral=True)
         
         log_embed = discord.Embed(
             title="⚖️ Membre Emprisonné",
@@ -112,6 +309,7 @@ class PrisonCog(commands.Cog, name="Système Prison"):
             color=discord.Color.dark_red(),
             timestamp=datetime.now(timezone.utc)
         ).add_field(name="Raison", value=raison)
+        log_embed.add_field(name="Libération", value=f"<t:{int(release_at)}:R>" if release_at else "Sur décision de la modération")
         if is_admin:
             log_embed.add_field(name="⚠️ Statut", value="Administrateur mis en pause. Rôles sauvegardés.", inline=False)
         try:
@@ -132,37 +330,18 @@ class PrisonCog(commands.Cog, name="Système Prison"):
 
         await interaction.response.defer(thinking=True, ephemeral=True)
 
-        prisoner_role = discord.utils.get(interaction.guild.roles, name=PRISONER_ROLE_NAME)
-        
-        saved_roles_json = prisoner_data.get("saved_roles")
-        
-        # 1. Gérer la restauration des rôles pour un admin
-        if saved_roles_json:
-            try:
-                role_ids_to_restore = json.loads(saved_roles_json)
-                roles_to_restore = [interaction.guild.get_role(rid) for rid in role_ids_to_restore if interaction.guild.get_role(rid) is not None]
-                
-                # Vérifier si on peut bien assigner tous les rôles
-                if any(r >= interaction.guild.me.top_role for r in roles_to_restore):
-                    await interaction.followup.send("❌ Erreur: Un des rôles sauvegardés est plus haut que le mien. Restauration manuelle requise.", ephemeral=True); return
-                
-                await membre.edit(roles=roles_to_restore, reason=f"Libéré de prison (Admin) par {interaction.user}")
-            except json.JSONDecodeError:
-                await interaction.followup.send("❌ Erreur critique: Impossible de lire les rôles sauvegardés. Restauration manuelle requise !", ephemeral=True); return
-            except discord.Forbidden:
-                await interaction.followup.send(f"❌ Je n'ai pas la permission de restaurer les rôles de {membre.mention}.", ephemeral=True); return
-        
-        # 2. Gérer le cas non-admin (simple retrait du rôle)
-        else:
-            if prisoner_role and prisoner_role in membre.roles:
-                try:
-                    await membre.remove_roles(prisoner_role, reason=f"Libéré de prison par {interaction.user}")
-                except discord.Forbidden:
-                    await interaction.followup.send(f"❌ Je n'ai pas la permission de retirer le rôle Prisonnier de {membre.mention}.", ephemeral=True); return
-        
-        # 3. Nettoyer la base de données
-        await self.db.remove_prisoner(interaction.guild.id, membre.id)
-        
+        try:
+            error = await self.restore_member(interaction.guild, membre, prisoner_data, f"Libéré de prison par {interaction.user}")
+        except discord.Forbidden:
+            await interaction.followup.send(f"❌ Je n'ai pas la permission de restaurer les rôles de {membre.mention}.", ephemeral=True); return
+        if error:
+            await interaction.followup.send(f"❌ {error}", ephemeral=True); return
+
+        # Nettoyer la base de données et la libération automatique éventuelle, en une seule transaction
+        async with self.db.transaction():
+            await self.db.remove_prisoner(interaction.guild.id, membre.id)
+            await job_queue.cancel(release_job_key(interaction.guild.id, membre.id))
+
         await interaction.followup.send(f"✅ **{membre.display_name}** a été libéré avec succès.", ephemeral=True)
         
         log_embed = discord.Embed(
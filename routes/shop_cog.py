@@ -2,49 +2,295 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Set, Tuple
 import json
 import os
 import traceback
 import datetime
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
 
 # --- Dépendances et Helpers ---
+from utils.database import InsufficientFunds, InsufficientXP, ItemUnavailable
+from utils.level_curve import to_total_xp
+from utils.rankings import rankings
+from utils.settings_store import settings_store
+
 DATA_DIR = './data'
-SHOP_DATA_FILE = os.path.join(DATA_DIR, 'shop_data.json')
-# Note : Pour l'achat, ce cog aura besoin de l'objet 'db' de utils.database
-# Assurez-vous que l'import est correct si vous l'utilisez
-# from utils.database import db
+# Les articles sont en base (tables shop_items / shop_orders) ; l'ancien fichier n'est lu qu'une fois pour l'import.
+LEGACY_SHOP_DATA_FILE = os.path.join(DATA_DIR, 'shop_data.json')
+SHOP_CONFIG_DEFAULTS = {"currency_name": "Points", "currency_emoji": "💰"}
+ITEMS_PER_PAGE = 8
+MAX_ITEM_DESCRIPTION_LENGTH = 200  # 8 articles tronqués tiennent dans les 4096 caractères d'un embed
+AUTOCOMPLETE_LIMIT = 25  # Maximum de choix accepté par Discord
+CHOICE_MAX_LENGTH = 100  # Longueur maximale du nom et de la valeur d'un choix Discord
+FUZZY_MIN_SCORE = 0.3
 
 def load_data(filepath):
     try:
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
         with open(filepath, 'r', encoding='utf-8') as f: return json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
-        with open(filepath, 'w', encoding='utf-8') as f: json.dump({}, f); return {}
+        return {}
     except Exception as e:
         print(f"Erreur chargement {filepath}: {e}"); traceback.print_exc(); return {}
 
-def save_data(filepath, data):
-    try:
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        temp_filepath = filepath + ".tmp"
-        with open(temp_filepath, 'w', encoding='utf-8') as f: json.dump(data, f, indent=4)
-        os.replace(temp_filepath, filepath)
-    except Exception as e:
-        print(f"Erreur critique sauvegarde {filepath}: {e}"); traceback.print_exc()
+def render_item_entry(guild: discord.Guild, item_data: dict, config) -> str:
+    """Texte d'un article tel qu'affiché dans le catalogue (description tronquée pour tenir dans une page)."""
+    name = item_data.get('display_name', item_data['item_key'])
+    price = item_data.get('price', 0)
+    xp_cost = item_data.get('xp_cost', 0)
+    desc = item_data.get('description') or 'N/A'
+    if len(desc) > MAX_ITEM_DESCRIPTION_LENGTH:
+        desc = desc[:MAX_ITEM_DESCRIPTION_LENGTH - 1] + "…"
+    quantity = item_data.get('quantity', -1)
+    qty_str = "Infinie" if quantity == -1 else str(quantity)
+    emoji = config.get('currency_emoji', '💰')
+    currency_name = config.get('currency_name', 'Points')
+
+    reward_parts = []
+    role_id = item_data.get('role_id')
+    xp_gain = item_data.get('xp_gain') or 0
+    if role_id and (role := guild.get_role(role_id)):
+        reward_parts.append(f"Rôle {role.mention}")
+    if xp_gain > 0:
+        reward_parts.append(f"**{xp_gain}** ✨ XP")
+    reward_str = " | Récompense: " + ", ".join(reward_parts) if reward_parts else ""
+
+    cost_parts = []
+    if price > 0:
+        cost_parts.append(f"**{price}** {emoji}{currency_name}")
+    if xp_cost > 0:
+        cost_parts.append(f"**{xp_cost}** ✨ XP")
+    cost_str = " et ".join(cost_parts) if cost_parts else "Gratuit"
+
+    return f"**{name}**{reward_str}\n> *{discord.utils.escape_markdown(desc)}*\n> **Coût :** {cost_str} | **Quantité :** `{qty_str}`\n\n"
+
+class ShopCatalog:
+    """
+    Catalogue pré-calculé d'un serveur : articles triés et pages déjà rendues.
+    Afficher une page ne coûte qu'un accès à une liste ; un changement de stock ne
+    re-rend que l'article concerné et sa page.
+    """
+    def __init__(self, entries: List[Tuple[str, str]]):
+        self._keys = [item_key for item_key, _ in entries]
+        self._entries = [text for _, text in entries]
+        self._positions = {item_key: i for i, item_key in enumerate(self._keys)}
+        self._pages = [self._render_page(i) for i in range(self.page_count)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self._entries) // ITEMS_PER_PAGE))
+
+    def _render_page(self, index: int) -> str:
+        return "".join(self._entries[index * ITEMS_PER_PAGE:(index + 1) * ITEMS_PER_PAGE])
+
+    def page(self, number: int) -> str:
+        """Page numérotée à partir de 1."""
+        return self._pages[min(max(number, 1), self.page_count) - 1]
+
+    def update_entry(self, item_key: str, text: str):
+        position = self._positions.get(item_key)
+        if position is None:
+            return
+        self._entries[position] = text
+        self._pages[position // ITEMS_PER_PAGE] = self._render_page(position // ITEMS_PER_PAGE)
+
+def normalize_name(name: str) -> str:
+    """Minuscules, sans accents ni espaces superflus : « Épée  Légendaire » -> « epee legendaire »."""
+    decomposed = unicodedata.normalize("NFKD", name.lower())
+    return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+def trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ItemNameIndex:
+    """
+    Index des noms d'articles d'un serveur pour l'autocomplétion :
+    - préfixe : liste triée des noms normalisés, recherche par bissection ;
+    - tolérance aux fautes : index inversé trigramme -> articles, score de similarité (Dice).
+    Mis à jour article par article (add/remove), sans reconstruction.
+    """
+    def __init__(self, items: List[Tuple[str, str]] = ()):
+        self._display_names: Dict[str, str] = {}
+        self._normalized: Dict[str, str] = {}
+        self._sorted: List[Tuple[str, str]] = []  # (nom normalisé, item_key)
+        self._postings: Dict[str, Set[str]] = {}
+        self._gram_counts: Dict[str, int] = {}
+        for item_key, display_name in items:
+            self.add(item_key, display_name)
+
+    def __len__(self) -> int:
+        return len(self._display_names)
+
+    def add(self, item_key: str, display_name: str):
+        if item_key in self._display_names:
+            self.remove(item_key)
+        normalized = normalize_name(display_name)
+        self._display_names[item_key] = display_name
+        self._normalized[item_key] = normalized
+        entry = (normalized, item_key)
+        self._sorted.insert(bisect_left(self._sorted, entry), entry)
+        grams = trigrams(normalized)
+        self._gram_counts[item_key] = len(grams)
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(item_key)
+
+    def remove(self, item_key: str):
+        normalized = self._normalized.pop(item_key, None)
+        if normalized is None:
+            return
+        del self._display_names[item_key]
+        del self._gram_counts[item_key]
+        entry = (normalized, item_key)
+        del self._sorted[bisect_left(self._sorted, entry)]
+        for gram in trigrams(normalized):
+            keys = self._postings.get(gram)
+            if keys:
+                keys.discard(item_key)
+                if not keys:
+                    del self._postings[gram]
+
+    def search(self, query: str, limit: int = AUTOCOMPLETE_LIMIT) -> List[Tuple[str, str]]:
+        """Retourne jusqu'à `limit` couples (item_key, nom affiché) : préfixes d'abord, puis les plus proches."""
+        query = normalize_name(query)
+        results: List[str] = []
+        start = bisect_left(self._sorted, (query, ""))
+        for normalized, item_key in self._sorted[start:start + limit]:
+            if not normalized.startswith(query):
+                break
+            results.append(item_key)
+
+        if len(results) < limit and query:
+            query_grams = trigrams(query)
+            hits = Counter()
+            for gram in query_grams:
+                hits.update(self._postings.get(gram, ()))
+            seen = set(results)
+            scored = []
+            for item_key, shared in hits.items():
+                if item_key in seen:
+                    continue
+                score = 2 * shared / (len(query_grams) + self._gram_counts[item_key])
+                if score >= FUZZY_MIN_SCORE:
+                    scored.append((-score, self._normalized[item_key], item_key))
+            results.extend(item_key for _, _, item_key in sorted(scored)[:limit - len(results)])
+        return [(item_key, self._display_names[item_key]) for item_key in results]
+
+class ShopCatalogView(discord.ui.View):
+    def __init__(self, catalog: ShopCatalog, guild_name: str, author_id: int):
+        super().__init__(timeout=180.0)
+        self.catalog = catalog
+        self.guild_name = guild_name
+        self.author_id = author_id
+        self.current_page = 1
+        self.message: Optional[discord.InteractionMessage] = None
+        self._update_buttons()
+
+    def build_embed(self) -> discord.Embed:
+        embed = discord.Embed(
+            title=f"🛍️ Boutique de {self.guild_name}",
+            description=self.catalog.page(self.current_page),
+            color=discord.Color.gold()
+        )
+        embed.set_footer(text=f"Page {self.current_page}/{self.catalog.page_count} • {len(self.catalog)} article(s)")
+        return embed
+
+    def _update_buttons(self):
+        self.previous_button.disabled = self.current_page <= 1
+        self.next_button.disabled = self.current_page >= self.catalog.page_count
+
+    async def _show_page(self, interaction: discord.Interaction, page: int):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Utilisez `/boutique voir` pour parcourir la boutique.", ephemeral=True)
+            return
+        self.current_page = min(max(page, 1), self.catalog.page_count)
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.build_embed(), view=self)
+
+    async def on_timeout(self):
+        if self.message:
+            for item in self.children:
+                item.disabled = True
+            try:
+                await self.message.edit(view=self)
+            except discord.NotFound:
+                pass
+
+    @discord.ui.button(label="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show_page(interaction, self.current_page - 1)
+
+    @discord.ui.button(label="▶️", style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show_page(interaction, self.current_page + 1)
 
 # --- Classe Cog ---
 class ShopCog(commands.Cog, name="Boutique"):
-    def __init__(self, bot: commands.Bot): # Retiré db_manager pour l'instant car non utilisé
+    def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.shop_data = load_data(SHOP_DATA_FILE)
+        self.db = bot.db
+        # Catalogues pré-calculés par serveur, invalidés quand les articles ou la config changent
+        self._catalogs: Dict[int, ShopCatalog] = {}
+        # Index des noms pour l'autocomplétion, mis à jour à chaque création/suppression d'article
+        self._name_indexes: Dict[int, ItemNameIndex] = {}
+
+    async def cog_load(self):
+        await self.import_legacy_shop_data()
+
+    async def cog_unload(self):
+        await settings_store.flush()
+
+    async def import_legacy_shop_data(self):
+        """Importe une seule fois l'ancien data/shop_data.json (articles en base, config dans settings.json)."""
+        if not os.path.exists(LEGACY_SHOP_DATA_FILE):
+            return
+        shop_data = load_data(LEGACY_SHOP_DATA_FILE)
+        count = 0
+        for guild_id_str, guild_data in shop_data.items():
+            if guild_data.get("config"):
+                async with settings_store.edit(int(guild_id_str), "shop_config") as config:
+                    config.update(guild_data["config"])
+            for item_key, item in guild_data.get("items", {}).items():
+                if await self.db.add_shop_item(int(guild_id_str), item_key, {"display_name": item_key, **item}):
+                    count += 1
+        os.replace(LEGACY_SHOP_DATA_FILE, LEGACY_SHOP_DATA_FILE + '.imported')
+        print(f"-> Cog Boutique : {count} articles importés depuis shop_data.json.")
+
+    def get_shop_config(self, guild_id: int):
+        return settings_store.get_section(guild_id, "shop_config", defaults=SHOP_CONFIG_DEFAULTS)
+
+    async def get_catalog(self, guild: discord.Guild) -> ShopCatalog:
+        catalog = self._catalogs.get(guild.id)
+        if catalog is None:
+            config = self.get_shop_config(guild.id)
+            items = await self.db.get_shop_items(guild.id)  # Déjà triés par prix, coût XP puis nom
+            catalog = self._catalogs[guild.id] = ShopCatalog(
+                [(item["item_key"], render_item_entry(guild, item, config)) for item in items]
+            )
+        return catalog
+
+    def invalidate_catalog(self, guild_id: int):
+        self._catalogs.pop(guild_id, None)
 
-    def get_guild_shop_data(self, guild_id: int) -> dict:
-        guild_id_str = str(guild_id)
-        guild_data = self.shop_data.setdefault(guild_id_str, {})
-        guild_data.setdefault("config", {"currency_name": "Points", "currency_emoji": "💰"})
-        guild_data.setdefault("items", {})
-        return guild_data
+    async def get_name_index(self, guild_id: int) -> ItemNameIndex:
+        index = self._name_indexes.get(guild_id)
+        if index is None:
+            items = await self.db.get_shop_items(guild_id)
+            index = self._name_indexes.setdefault(guild_id, ItemNameIndex(
+                [(item["item_key"], item["display_name"]) for item in items]
+            ))
+        return index
+
+    async def item_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+        index = await self.get_name_index(interaction.guild.id)
+        # Une valeur tronquée ne correspondrait plus à l'article : les clés trop longues (anciens imports) sont ignorées
+        return [app_commands.Choice(name=display_name[:CHOICE_MAX_LENGTH], value=item_key)
+                for item_key, display_name in index.search(current) if len(item_key) <= CHOICE_MAX_LENGTH]
 
     # =============================================
     # ==          GROUPE COMMANDES BOUTIQUE      ==
@@ -53,52 +299,87 @@ class ShopCog(commands.Cog, name="Boutique"):
 
     @boutique_group.command(name="voir", description="Affiche les articles disponibles dans la boutique.")
     async def boutique_voir(self, interaction: discord.Interaction):
-        guild_data = self.get_guild_shop_data(interaction.guild.id)
-        items = guild_data.get("items", {})
-        config = guild_data.get("config", {})
-        
-        if not items:
+        catalog = await self.get_catalog(interaction.guild)
+        if not len(catalog):
             await interaction.response.send_message("ℹ️ La boutique est actuellement vide.", ephemeral=True); return
 
-        embed = discord.Embed(title=f"🛍️ Boutique de {interaction.guild.name}", color=discord.Color.gold())
-        description = ""
-        sorted_items = sorted(items.items(), key=lambda item: (item[1].get('price', 0), item[1].get('xp_cost', 0)))
-
-        for item_key, item_data in sorted_items:
-            name = item_data.get('display_name', item_key)
-            price = item_data.get('price', 0)
-            xp_cost = item_data.get('xp_cost', 0)
-            desc = item_data.get('description', 'N/A')
-            quantity = item_data.get('quantity', -1)
-            qty_str = "Infinie" if quantity == -1 else str(quantity)
-            emoji = config.get('currency_emoji', '💰')
-            currency_name = config.get('currency_name', 'Points')
-            
-            reward_parts = []
-            role_id = item_data.get('role_id')
-            xp_gain = item_data.get('xp_gain', 0)
-            if role_id and (role := interaction.guild.get_role(role_id)):
-                reward_parts.append(f"Rôle {role.mention}")
-            if xp_gain > 0:
-                reward_parts.append(f"**{xp_gain}** ✨ XP")
-            reward_str = " | Récompense: " + ", ".join(reward_parts) if reward_parts else ""
-
-            cost_parts = []
-            if price > 0:
-                cost_parts.append(f"**{price}** {emoji}{currency_name}")
-            if xp_cost > 0:
-                cost_parts.append(f"**{xp_cost}** ✨ XP")
-            cost_str = " et ".join(cost_parts) if cost_parts else "Gratuit"
-            
-            description += f"**{name}**{reward_str}\n> *{discord.utils.escape_markdown(desc)}*\n> **Coût :** {cost_str} | **Quantité :** `{qty_str}`\n\n"
-        
-        embed.description = description
-        await interaction.response.send_message(embed=embed)
+        view = ShopCatalogView(catalog, interaction.guild.name, interaction.user.id)
+        await interaction.response.send_message(embed=view.build_embed(), view=view)
+        view.message = await interaction.original_response()
 
     @boutique_group.command(name="acheter", description="Acheter un article de la boutique.")
     @app_commands.describe(article="Le nom de l'article que vous voulez acheter.")
+    @app_commands.autocomplete(article=item_autocomplete)
     async def boutique_acheter(self, interaction: discord.Interaction, article: str):
-        await interaction.response.send_message(f"Fonctionnalité d'achat pour **{article}** en cours de développement !", ephemeral=True)
+        await interaction.response.defer(ephemeral=True)
+        guild, member = interaction.guild, interaction.user
+        item_key = article.lower().strip()
+        config = self.get_shop_config(guild.id)
+        emoji = config.get('currency_emoji', '💰')
+
+        item = await self.db.get_shop_item(guild.id, item_key)
+        if not item:
+            suggestions = (await self.get_name_index(guild.id)).search(article, limit=1)
+            hint = f" Vouliez-vous dire **{suggestions[0][1]}** ?" if suggestions else ""
+            await interaction.followup.send(f"❌ L'article `{article}` n'a pas été trouvé.{hint}", ephemeral=True); return
+        role = guild.get_role(item["role_id"]) if item["role_id"] else None
+        if item["role_id"] and (not role or role >= guild.me.top_role):
+            await interaction.followup.send("❌ Le rôle de cet article n'est plus attribuable, contactez un administrateur.", ephemeral=True); return
+        if role and role in member.roles:
+            await interaction.followup.send(f"ℹ️ Vous avez déjà le rôle {role.mention}.", ephemeral=True); return
+
+        # Les gains d'XP en attente dans le tampon du cog de leveling sont écrits d'abord : la transaction
+        # d'achat vérifie et débite l'XP en base, avec le stock et la commande
+        leveling_cog = self.bot.get_cog("Système de Niveaux")
+        xp_buffer = leveling_cog.xp_buffer if leveling_cog else None
+        uses_xp = item["xp_cost"] > 0 or item["xp_gain"] > 0
+        if xp_buffer and uses_xp:
+            await xp_buffer.flush_user(guild.id, member.id)
+
+        try:
+            result = await self.db.purchase_item(guild.id, member.id, item_key)
+        except (ItemUnavailable, InsufficientFunds, InsufficientXP) as e:
+            if isinstance(e, ItemUnavailable):
+                message = "❌ Cet article est épuisé." if e.sold_out else f"❌ L'article `{article}` n'a pas été trouvé."
+            elif isinstance(e, InsufficientFunds):
+                message = f"❌ Solde insuffisant : il faut **{e.amount}** {emoji} (vous avez {e.balance})."
+            else:
+                message = f"❌ XP insuffisante : il faut **{e.cost}** ✨ XP."
+            await interaction.followup.send(message, ephemeral=True); return
+        finally:
+            if xp_buffer and uses_xp:
+                # L'état en mémoire chargé pendant l'achat est périmé : il sera relu en base
+                await xp_buffer.flush_user(guild.id, member.id)
+
+        if result["price"] > 0:
+            rankings.update("money", guild.id, member.id, result["balance"])
+        if result["quantity"] != -1 and (catalog := self._catalogs.get(guild.id)):
+            # Seul le stock a changé : on re-rend uniquement cet article
+            catalog.update_entry(item_key, render_item_entry(guild, result, config))
+
+        if uses_xp:
+            rankings.update("xp", guild.id, member.id, to_total_xp(result["level"], result["xp"]))
+
+        rewards = []
+        if result["xp_gain"] > 0:
+            rewards.append(f"**{result['xp_gain']}** ✨ XP")
+            if leveling_cog and result["levels_gained"] > 0:
+                new_level = result["level"]
+                settings = await self.db.get_guild_settings(guild.id) or {}
+                await leveling_cog.grant_level_rewards(member, settings.get("leveling_config") or {}, new_level - result["levels_gained"], new_level)
+        if role:
+            try:
+                await member.add_roles(role, reason=f"Achat boutique (commande #{result['order_id']})")
+                rewards.append(f"le rôle {role.mention}")
+            except discord.HTTPException as e:
+                print(f"ERREUR attribution du rôle {role.id} (commande #{result['order_id']}) : {e}")
+                rewards.append(f"⚠️ le rôle {role.mention} n'a pas pu être attribué, contactez un administrateur (commande #{result['order_id']})")
+
+        reward_str = " et ".join(rewards) if rewards else "rien"
+        await interaction.followup.send(
+            f"✅ Achat de **{result['display_name']}** réussi ! Vous recevez {reward_str}.",
+            ephemeral=True, allowed_mentions=discord.AllowedMentions.none()
+        )
 
     # =============================================
     # ==      COMMANDES ADMIN POUR LA BOUTIQUE   ==
@@ -111,11 +392,10 @@ class ShopCog(commands.Cog, name="Boutique"):
         emoji_monnaie="L'emoji pour la monnaie (ex: 💰)."
     )
     async def boutique_configurer(self, interaction: discord.Interaction, nom_monnaie: str, emoji_monnaie: str):
-        guild_data = self.get_guild_shop_data(interaction.guild.id)
-        config = guild_data["config"]
-        config["currency_name"] = nom_monnaie
-        config["currency_emoji"] = emoji_monnaie
-        save_data(SHOP_DATA_FILE, self.shop_data)
+        async with settings_store.edit(interaction.guild.id, "shop_config") as config:
+            config["currency_name"] = nom_monnaie
+            config["currency_emoji"] = emoji_monnaie
+        self.invalidate_catalog(interaction.guild.id)
         await interaction.response.send_message(f"✅ La monnaie de la boutique a été définie sur : {emoji_monnaie} {nom_monnaie}", ephemeral=True)
 
     @boutique_group.command(name="créer-item", description="Crée un nouvel article pour la boutique.")
@@ -130,7 +410,7 @@ class ShopCog(commands.Cog, name="Boutique"):
         quantite="Optionnel : Quantité disponible (-1 ou vide pour infini)."
     )
     async def boutique_creer_item(self, interaction: discord.Interaction,
-                                  nom: str,
+                                  nom: app_commands.Range[str, 1, CHOICE_MAX_LENGTH],
                                   description: str,
                                   prix: Optional[app_commands.Range[int, 0, None]] = None,
                                   cout_xp: Optional[app_commands.Range[int, 0, None]] = None,
@@ -147,25 +427,24 @@ class ShopCog(commands.Cog, name="Boutique"):
         if not role_recompense and xp_gain_val <= 0:
             await interaction.response.send_message("❌ L'article doit avoir une récompense ! Spécifiez un `role_recompense` ou `xp_a_donner`.", ephemeral=True); return
 
-        guild_data = self.get_guild_shop_data(interaction.guild.id)
-        items = guild_data["items"]
         item_key = nom.lower().strip()
 
-        if item_key in items:
-            await interaction.response.send_message(f"❌ Un article nommé `{nom}` existe déjà.", ephemeral=True); return
-
         if role_recompense and role_recompense >= interaction.guild.me.top_role:
             await interaction.response.send_message(f"❌ Je ne peux pas gérer le rôle {role_recompense.mention}.", ephemeral=True); return
 
-        items[item_key] = {
+        created = await self.db.add_shop_item(interaction.guild.id, item_key, {
             "display_name": nom, "description": description, "price": prix_val, "xp_cost": xp_val,
             "role_id": role_recompense.id if role_recompense else None, "xp_gain": xp_gain_val,
-            "quantity": quantite, "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
-        }
-        
-        save_data(SHOP_DATA_FILE, self.shop_data)
+            "quantity": quantite if quantite is not None else -1,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        })
+        if not created:
+            await interaction.response.send_message(f"❌ Un article nommé `{nom}` existe déjà.", ephemeral=True); return
+        self.invalidate_catalog(interaction.guild.id)
+        if index := self._name_indexes.get(interaction.guild.id):
+            index.add(item_key, nom)
 
-        config = guild_data.get("config", {}); currency_emoji = config.get('currency_emoji', '💰')
+        config = self.get_shop_config(interaction.guild.id); currency_emoji = config.get('currency_emoji', '💰')
         cost_parts = []
         if prix_val > 0: cost_parts.append(f"{prix_val}{currency_emoji}")
         if xp_val > 0: cost_parts.append(f"{xp_val}✨ XP")
@@ -184,23 +463,23 @@ class ShopCog(commands.Cog, name="Boutique"):
     @boutique_group.command(name="supprimer-item", description="Supprime un article de la boutique.")
     @app_commands.checks.has_permissions(manage_guild=True)
     @app_commands.describe(article="Le nom de l'article à supprimer.")
+    @app_commands.autocomplete(article=item_autocomplete)
     async def boutique_supprimer_item(self, interaction: discord.Interaction, article: str):
-        guild_data = self.get_guild_shop_data(interaction.guild.id)
-        items = guild_data["items"]
-        item_key_to_delete = article.lower().strip()
-
-        if item_key_to_delete not in items:
+        deleted = await self.db.remove_shop_item(interaction.guild.id, article.lower().strip())
+        if not deleted:
             await interaction.response.send_message(f"❌ L'article `{article}` n'a pas été trouvé.", ephemeral=True); return
+        self.invalidate_catalog(interaction.guild.id)
+        if index := self._name_indexes.get(interaction.guild.id):
+            index.remove(deleted["item_key"])
             
-        display_name = items[item_key_to_delete].get("display_name", article)
-        del items[item_key_to_delete]
-        save_data(SHOP_DATA_FILE, self.shop_data)
+        display_name = deleted.get("display_name", article)
         
         await interaction.response.send_message(f"🗑️ L'article `{display_name}` a été supprimé de la boutique.", ephemeral=True)
 
 # --- Setup du Cog ---
 async def setup(bot: commands.Bot):
-    # CORRECTION : Le __init__ de ShopCog n'a pas besoin de db_manager pour l'instant
-    # Si la commande /acheter est implémentée, il faudra le passer comme pour les autres cogs.
+    if not hasattr(bot, 'db'):
+        print("ERREUR CRITIQUE (shop_cog.py): L'objet bot n'a pas d'attribut 'db'.")
+        return
     await bot.add_cog(ShopCog(bot))
     print("Cog Boutique (corrigé) chargé.")
\ No newline at end of file